@@ -1,115 +1,644 @@
 import re
+import importlib
 import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from datetime import datetime
 import os
-import requests
-import paramiko
+import posixpath
 from ovos_workshop.skills.ovos import OVOSSkill
 from ovos_bus_client.message import Message
 from ovos_utils.log import LOG
+from .connection import SFTPConnectionManager
+from .dedup import DedupIndex, note_hash
+from .intake import NoteIntake
+from .journal import NoteJournal
+from .layout import shard_dir
+from .metrics import NoteMetrics
+from .note_buffer import NoteBuffer
+from .note_parser import (BLOCK, ENDNOTE, LABEL, NOTE, PERSONA_SKILL_ID, block_ended, classify_utterance,
+                          label_value, parse_block)
+from .replication import ReplicatedStorage
+from .sessions import NoteSessionRegistry
+from .templates import NoteTemplates, date_fields
+from .storage import LocalStorage, MemoryStorage, SFTPStorage
+from .streaming import NoteStream
+from .upload_queue import NoteUploadQueue
+from .vault_index import VaultIndex
+from .weather import DEFAULT_WEATHER_URL, WeatherCache
 
 DEFAULT_SETTINGS = {
     "log_level": "INFO"
 }
+ORIGIN = "OVOS ObsidianAddNote Skill"
 
 class ObsidianAddNoteSkill(OVOSSkill):
     def __init__(self, *args, **kwargs):
+        # Voor super().__init__, die initialize() al kan aanroepen
+        # API / settings placeholders
+        self.api_key = None
+        self.city = None
+        self.storage = None
+        self._storage_key = None
+        self._storage_lock = threading.Lock()
+        self._pipeline = None
+        self._weather_future = None
+        self._warm_up_executor = None
+        self._warm_up_future = None
+        self._stream_executor = None
+        self.intake = None
+        self._intake_open = set()
+        self.upload_queue = None
+        self.weather = None
+        self.metrics = NoteMetrics()
+        self.sessions = None
+        self.templates = NoteTemplates()
+        self.dedup = None
+        self.journal = None
+        self.vault_index = None
+        self._index_lock = threading.Lock()
+        self._index_refreshes = 0
+        self._inflight = set()
+        self._resync_lock = threading.Lock()
+        self._max_note_size = 1024 * 1024
+        self._content_spill_size = 256 * 1024
+        self._track_in_progress = False
         super().__init__(*args, **kwargs)
         # Regex om NOTE te detecteren in LLM output
         #self.note_pattern = re.compile(r"\bNOTE\b(.*)", re.DOTALL)
         #self.note_pattern = re.compile(r"\[?NOTE\]?(.*)", re.DOTALL)
         #self.note_start_pattern = re.compile(r"\[?\s*NOTE\s*\]?", re.IGNORECASE)
         #self.note_end_pattern = re.compile(r"\[?\s*ENDNOTE\s*\]?", re.IGNORECASE)
-        # API / settings placeholders
-        self.api_key = None
-        self.city = None
 
     def initialize(self):
-        self.collecting_note = False
-        self.current_note = {"titel": None, "doel": None, "inhoud": ""}
-        self.await_field = None
+        self._cache_settings()
+        # Note state per bus sessie, zodat satellieten die tegelijk dicteren elkaar niet storen
+        session_cfg = self.settings.get("sessions", {})
+        self.sessions = NoteSessionRegistry(
+            self._new_note,
+            idle_timeout=session_cfg.get("idle_timeout", 600),
+            max_sessions=session_cfg.get("max_sessions", 32),
+            on_evict=self._on_session_evicted
+        )
+        self.settings_change_callback = self._on_settings_changed
         # Haal settings uit OVOS settings
         self.api_key = self.settings.get("api_key")
         self.city = self.settings.get("city", "Nederland")
+        self.weather = WeatherCache(
+            self.api_key,
+            ttl=self.settings.get("weather_ttl", 1800),
+            url=self.settings.get("weather_url", DEFAULT_WEATHER_URL),
+            lang=self.settings.get("weather_lang", "nl"),
+            units=self.settings.get("weather_units", "metric"),
+            metrics=self.metrics
+        )
+        refresh = self.settings.get("weather_refresh", 0)
+        if refresh and self.api_key:
+            self.schedule_repeating_event(self._refresh_weather, datetime.now(), refresh,
+                                          name="ObsidianWeatherRefresh")
+        # Weer ophalen en verbinden met de opslag tegelijk in plaats van na elkaar
+        if self.settings.get("pipeline", {}).get("enabled", True):
+            self._pipeline = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ObsidianPipeline")
+            # Eigen thread voor het klaarzetten van de opslag: een warm-up die op de verbinding wacht
+            # (lange bijlage, trage connect) mag de weer aanvragen in de pipeline niet ophouden
+            self._warm_up_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ObsidianWarmUp")
+        # Optioneel de notitie al tijdens het dicteren naar de vault schrijven
+        if self.settings.get("streaming", {}).get("enabled", False):
+            self._stream_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ObsidianStream")
+        # Lokale index van de vault voor [[links]] naar verwante notities
+        index_cfg = self.settings.get("vault_index", {})
+        if index_cfg.get("enabled", False):
+            self.vault_index = VaultIndex(os.path.join(self.file_system.path, "vault_index.json"),
+                                          max_read=index_cfg.get("max_read", 4096))
+            self._start_index_refresh()
+            self.schedule_repeating_event(self._start_index_refresh, datetime.now(),
+                                          index_cfg.get("refresh_interval", 900),
+                                          name="ObsidianVaultIndexRefresh")
+        # Afgeronde notities eerst lokaal vastleggen, zodat een mislukte upload of herstart ze niet kwijtraakt
+        journal_cfg = self.settings.get("journal", {})
+        if journal_cfg.get("enabled", True):
+            self.journal = NoteJournal(os.path.join(self.file_system.path, "journal.jsonl"),
+                                       compact_after=journal_cfg.get("compact_after", 50),
+                                       max_attempts=journal_cfg.get("max_attempts", 10))
+            self._restore_sessions()
+        # Uploads op de achtergrond zodat de bus handler nooit op SSH/HTTP wacht
+        queue_cfg = self.settings.get("upload_queue", {})
+        if queue_cfg.get("enabled", True):
+            self.upload_queue = NoteUploadQueue(
+                self._upload_notes,
+                workers=queue_cfg.get("workers", 1),
+                maxsize=queue_cfg.get("maxsize", 50),
+                max_retries=queue_cfg.get("max_retries", 3),
+                backoff=queue_cfg.get("backoff", 2.0),
+                batch_size=queue_cfg.get("batch_size", 1),
+                linger=queue_cfg.get("linger", 0.5),
+                on_failure=self._on_upload_failed
+            )
+            self.upload_queue.start()
+        # Herhaalde NOTE blokken van de persona niet nog een keer uploaden
+        dedup_cfg = self.settings.get("dedup", {})
+        if dedup_cfg.get("enabled", True) and dedup_cfg.get("window", 3600):
+            self.dedup = DedupIndex(
+                os.path.join(self.file_system.path, "dedup.json"),
+                window=dedup_cfg.get("window", 3600),
+                max_entries=dedup_cfg.get("max_entries", 1000)
+            )
+        metrics_cfg = self.settings.get("metrics", {})
+        if metrics_cfg.get("prometheus_file"):
+            self.schedule_repeating_event(self._export_metrics, datetime.now(),
+                                          metrics_cfg.get("export_interval", 60),
+                                          name="ObsidianMetricsExport")
+        # Begrensde wachtrij tussen de bus en de verwerking, zodat een piek de bus niet ophoudt
+        intake_cfg = self.settings.get("intake", {})
+        if intake_cfg.get("enabled", False):
+            self.intake = NoteIntake(
+                self._process_utterance,
+                maxsize=intake_cfg.get("maxsize", 1000),
+                workers=intake_cfg.get("workers", 1),
+                overflow=intake_cfg.get("overflow", "block"),
+                block_timeout=intake_cfg.get("block_timeout", 5.0),
+                is_relevant=self._intake_relevant,
+                metrics=self.metrics
+            )
+            self.intake.start()
         # Subscribe naar speak events
         self.add_event("speak", self.handle_speak)
         self.add_event("ovos.speech.recognition.intent_response", self.handle_speak)
+        self.add_event("obsidian.note.stats", self.handle_stats_request)
+        self.add_event("obsidian.note.audio", self.handle_audio)
+        self.add_event("obsidian.note.retry", self.handle_retry_request)
+        if self.journal is not None:
+            # Notities van voor een herstart of storing in één sessie alsnog uploaden
+            self._start_resync()
+            resync = journal_cfg.get("resync_interval", 300)
+            if resync:
+                self.schedule_repeating_event(self._start_resync, datetime.now(), resync,
+                                              name="ObsidianJournalResync")
+        # paramiko en requests worden pas bij het eerste gebruik geladen, optioneel al op de achtergrond
+        if self.settings.get("prewarm", False):
+            threading.Thread(target=self._prewarm, name="ObsidianPrewarm", daemon=True).start()
         LOG.info("ObsidianAddNoteSkill ready")
 
+    def _prewarm(self):
+        """Laad de zware modules vooraf, zodat de eerste ENDNOTE er niet op hoeft te wachten"""
+        modules = []
+        if self.settings.get("storage", "sftp") == "sftp":
+            modules.append("paramiko")
+        if self.api_key:
+            modules.append("requests")
+        with self.metrics.timed("prewarm"):
+            for name in modules:
+                try:
+                    importlib.import_module(name)
+                except ImportError as e:
+                    LOG.warning(f"Vooraf laden van {name} mislukt: {e}")
+
     def handle_speak(self, message):
-        utterance = message.data.get("utterance", "").strip()
-        meta = message.data.get("meta", {})
-        skill_source = meta.get("skill_id") or meta.get("skill")
-        if skill_source != "persona.openvoiceos":
+        # Snel afwijzen: alleen events van de persona, zonder iets te alloceren
+        data = message.data
+        meta = data.get("meta")
+        if not meta or (meta.get("skill_id") or meta.get("skill")) != PERSONA_SKILL_ID:
             return
+        utterance = data.get("utterance", "").strip()
 
-        # Debug log
-        self.log.debug(f"Received utterance: {utterance}")
+        # Debug log alleen als debug aan staat: dit draait voor elk persona event
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("Received utterance (%d tekens)", len(utterance))
 
-        # Start nieuwe note bij NOTE
-        if "NOTE" in utterance.upper() and "ENDNOTE" not in utterance.upper():
-            self.collecting_note = True
-            self.current_note = {"titel": None, "doel": None, "inhoud": ""}
-            self.await_field = None
-            self.log.info("NOTE detected, start collecting note")
-            return
+        # Als _session_id, hier ingevuld om een functieaanroep per event te sparen
+        session = message.context.get("session")
+        session_id = (session and session.get("session_id")) or "default"
+        if self.intake is not None:
+            self._submit_intake(session_id, utterance)
+        else:
+            self._process_utterance(session_id, utterance)
 
+    def _submit_intake(self, session_id, utterance):
+        # Op de bus thread bijhouden welke sessies een notitie dicteren, los van de achterstand van de consumer
+        classified = classify_utterance(utterance)
+        kind, value = classified
+        # Een compact NOTE blok telt als NOTE; loopt het in deze utterance al af, dan ook als ENDNOTE
+        if kind in (NOTE, BLOCK):
+            self._intake_open.add(session_id)
+        # De classificatie gaat mee, de consumer hoeft de utterance niet nog eens te scannen
+        self.intake.submit(session_id, utterance, classified)
+        if kind == ENDNOTE or (kind == BLOCK and block_ended(value)):
+            self._intake_open.discard(session_id)
 
-        # ENDNOTE detecteren (met of zonder [])
-        if re.fullmatch(r"\[?ENDNOTE\]?", utterance.strip(), re.IGNORECASE):
-            self.log.info(f"ENDNOTE detected, finalizing note: {self.current_note}")
-            self.add_note(
-                self.current_note["titel"],
-                self.current_note["doel"],
-                self.current_note["inhoud"]
-            )
-            self.collecting_note = False
-            self.current_note = {"titel": None, "doel": None, "inhoud": ""}
-            self.await_field = None
+    def _intake_relevant(self, session_id, utterance):
+        """Bij een volle wachtrij: alleen events van een notitie in wording niet weggooien"""
+        return session_id in self._intake_open
+
+    def _process_utterance(self, session_id, utterance, classified=None):
+        session = self.sessions.get(session_id)
+        note = session.note
+        if self._collect(session, utterance, classified):
+            # Eén meting per notitie, van de utterance die hem afrondt: meten bij elk event kost meer
+            # dan het parsen, en sessions.get heeft last_seen net voor het parsen gezet
+            self.metrics.observe("parse", time.monotonic() - session.last_seen)
+            self._finalize_note(session)
+        elif session.collecting and (session.note is not note or self._track_in_progress
+                                     or self._stream_executor is not None):
+            self._note_progress(session, utterance, session.note is not note)
+
+    def _note_progress(self, session, utterance, started):
+        """Na een utterance van een notitie in wording: warm-up bij NOTE, journal en streamen"""
+        if started and self._pipeline is not None:
+            self._start_warm_up(session)
+        if self._track_in_progress and self.journal is not None:
+            # Een NOTE begint een nieuwe notitie (en dus een nieuwe note dict)
+            self.journal.track(session.session_id, utterance, begin=started)
+        if self._stream_executor is not None and session.stream is None:
+            self._start_stream(session)
+
+    def handle_audio(self, message):
+        """obsidian.note.audio: sla het audiobestand van het dictaat op bij de volgende notitie van de sessie"""
+        path = message.data.get("path")
+        if not path or not os.path.isfile(path):
+            self.log.warning(f"Audio voor notitie niet gevonden: {path}")
             return
-        
-        if not self.collecting_note:
+        path = self._audio_source(path)
+        if path is None:
             return
+        session = self.sessions.get(self._session_id(message))
+        session.audio = path
+        self.log.debug(f"Audio {path} klaargezet voor sessie {session.session_id}")
+
+    @staticmethod
+    def _session_id(message):
+        session = message.context.get("session")
+        return (session and session.get("session_id")) or "default"
+
+    def _collect(self, session, utterance, classified=None):
+        """Verwerk één utterance in de note state van de sessie, True als de notitie af is (ENDNOTE).
+
+        classified is het resultaat van classify_utterance als dat al bekend is.
+        """
+        kind, value = classified or classify_utterance(utterance)
+        note = session.note
+
+        if session.block is not None and kind not in (NOTE, BLOCK):
+            return self._continue_block(session, utterance, kind == ENDNOTE)
+
+        # Start nieuwe note bij NOTE, of bij een heel NOTE blok in één utterance
+        if kind in (NOTE, BLOCK):
+            session.collecting = True
+            if session.stream:
+                session.stream.abort()
+            session.stream = None
+            note["inhoud"].close()
+            session.note = self._new_note()
+            session.await_field = None
+            session.truncated = False
+            session.block = None
+            if kind == BLOCK:
+                session.block = []
+                return self._continue_block(session, value, block_ended(value))
+            self.log.info("NOTE detected, start collecting note (sessie %s)", session.session_id)
+            return False
+
+        if not session.collecting:
+            return False
+
+        # ENDNOTE (met of zonder []), eventueel met een laatste contentregel ervoor
+        if kind == ENDNOTE:
+            if session.await_field == "inhoud" and value:
+                self._append_content(session, value)
+            return True
 
         # Wachten op een specifiek veld
-        if self.await_field:
-            if self.await_field == "inhoud":
-                # Check of ENDNOTE in dezelfde utterance zit
-                if "ENDNOTE" in utterance.upper():
-                    content_part = utterance.replace("ENDNOTE", "").strip()
-                    if content_part:
-                        self.current_note["inhoud"] += content_part + "\n"
-
-                    self.log.info(f"ENDNOTE detected, finalizing note: {self.current_note}")
-                    self.add_note(
-                        self.current_note["titel"],
-                        self.current_note["doel"],
-                        self.current_note["inhoud"]
-                    )
-                    # Reset state
-                    self.collecting_note = False
-                    self.current_note = {"titel": None, "doel": None, "inhoud": ""}
-                    self.await_field = None
-                    return
-                else:
-                    # Normale contentregel
-                    self.current_note["inhoud"] += utterance.strip() + "\n"
+        if session.await_field == "inhoud":
+            # Normale contentregel
+            self._append_content(session, utterance)
+        elif session.await_field:
+            # Titel of doel
+            note[session.await_field] = utterance
+            session.await_field = None
+        elif kind == LABEL:
+            # "Titel: ..." met de waarde erachter, of het volgende event bevat het veld
+            # Alleen het label ("Titel") is veruit het meest voorkomend, dan is er geen waarde om te zoeken
+            inline = label_value(utterance) if len(utterance) > len(value) else ""
+            if inline and value != "inhoud":
+                note[value] = inline
             else:
-                # Titel of doel
-                self.current_note[self.await_field] = utterance.strip()
-                self.await_field = None
-        else:
-            # Detecteer welk veld het volgende event zal bevatten
-            if utterance.lower().startswith("titel"):
-                self.await_field = "titel"
-            elif utterance.lower().startswith("doel"):
-                self.await_field = "doel"
-            elif utterance.lower().startswith("inhoud"):
-                self.await_field = "inhoud"
+                session.await_field = value
+                if inline:
+                    self._append_content(session, inline)
+
+        # Debug status log, alleen groottes en niet de hele inhoud
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("Collecting note: %s", session)
+        return False
 
-        # Debug status log
-        self.log.debug(f"Collecting note: {self.current_note}, awaiting field: {self.await_field}")
+    def _continue_block(self, session, text, ended):
+        """Verzamel een NOTE blok tot ENDNOTE en parse het dan in één keer, True als de notitie af is"""
+        session.block.append(text)
+        if not ended:
+            if sum(map(len, session.block)) < self._max_note_size:
+                return False
+        block = "\n".join(session.block)
+        session.block = None
+        parsed = parse_block(block) if ended else None
+        if parsed is None:
+            # Terugvallen op de state machine, regel voor regel zonder de NOTE marker
+            self.log.warning(f"NOTE blok in sessie {session.session_id} niet herkend, regel voor regel verwerkt")
+            for line in block[len("NOTE"):].lstrip(" ]:").split("\n"):
+                line = line.strip()
+                if line and self._collect(session, line):
+                    return True
+            return False
+        title, goal, lines = parsed
+        session.note["titel"], session.note["doel"] = title, goal
+        for line in lines:
+            self._append_content(session, line)
+        self.log.info(f"NOTE blok ontvangen (sessie {session.session_id}, {len(lines)} regels)")
+        return True
+
+    def _append_content(self, session, line):
+        buffer = session.note["inhoud"]
+        max_size = self._max_note_size
+        if buffer.size + len(line) >= max_size:
+            if not session.truncated:
+                self.log.warning(f"Notitie in sessie {session.session_id} groter dan "
+                                 f"{max_size} tekens, verdere inhoud genegeerd")
+                session.truncated = True
+            return
+        buffer.append_line(line)
+        if session.stream:
+            session.stream.append(line + "\n")
 
+    def _start_stream(self, session):
+        """Open de notitie in de vault zodra titel en doel bekend zijn"""
+        note = session.note
+        if not (note["titel"] and note["doel"]):
+            return
+        if self.settings.get("daily_note", False):
+            # De dagnotitie wordt door meerdere notities gedeeld, die wordt niet gestreamd
+            session.stream = False
+            return
+        storage = self._get_storage()
+        if storage is None:
+            session.stream = False
+            return
+        title, goal = note["titel"], note["doel"]
+        timestamp = datetime.now()
+        filename = self._note_path(title, timestamp)
+        audio = session.audio
+        template = self.templates.get("note", self.settings)
+        atomic = self.settings.get("streaming", {}).get("atomic", True)
+
+        def opener():
+            # Op de stream thread: weer, kop en staart renderen en het bestand openen
+            weather = self._weather_and_warm_up()
+            values = self._template_values(timestamp, title=title, goal=goal, origin=ORIGIN, weather=weather,
+                                           related=self._related_links(title, goal),
+                                           attachments=self._attachment_embed(filename, audio))
+            head, tail = template.render_split(values)
+            return storage.open_stream(filename, atomic=atomic), head, tail
+
+        session.stream = NoteStream(self._stream_executor, opener, filename, timestamp)
+        session.stream.audio = audio
+        if note["inhoud"]:
+            session.stream.append(note["inhoud"].getvalue())
+
+    def _restore_sessions(self):
+        """Speel onafgemaakte notities uit het journal opnieuw af in hun sessie"""
+        for session_id, utterances in self.journal.open_sessions().items():
+            session = self.sessions.get(session_id)
+            for utterance in utterances:
+                self._collect(session, utterance)
+            self.log.info(f"Onafgemaakte notitie van sessie {session_id} hersteld "
+                          f"({len(utterances)} utterances)")
+
+    def _on_session_evicted(self, session, reason):
+        # Zonder ENDNOTE blijft een sessie anders voor altijd "relevant" bij een volle intake wachtrij
+        self._intake_open.discard(session.session_id)
+        self._discard_warm_up(session)
+        if session.stream:
+            session.stream.abort()
+        if self.journal is not None:
+            self.journal.end(session.session_id)
+        if session.collecting:
+            self.log.warning(f"Onafgemaakte notitie in sessie {session.session_id} "
+                             f"verworpen ({reason}): {session.note}")
+        session.note["inhoud"].close()
+
+    def _new_note(self):
+        return {"titel": None, "doel": None, "inhoud": NoteBuffer(max_memory=self._content_spill_size)}
+
+    def _finalize_note(self, session):
+        """Geef de afgeronde notitie door aan de upload wachtrij en reset de state van de sessie"""
+        self.log.info("ENDNOTE detected, finalizing note: %s", session.note)
+        # De NoteBuffer gaat mee en wordt pas bij het renderen in de markdown gestreamd
+        note = dict(session.note, timestamp=datetime.now())
+        if session.audio:
+            note["audio"] = session.audio
+            session.audio = None
+        if session.stream:
+            note["stream"] = session.stream
+            note["timestamp"] = session.stream.timestamp
+        session.stream = None
+        session.collecting = False
+        session.note = self._new_note()
+        session.await_field = None
+        self.metrics.inc("notes_finalized")
+        if session.warm is not None:
+            self._settle_warm_up(session)
+        if self.journal is not None:
+            note["id"] = uuid.uuid4().hex
+            self._inflight.add(note["id"])
+            self.journal.add_note(note["id"], note)
+            self.journal.end(session.session_id)
+
+        if self.upload_queue is None:
+            try:
+                error = self._upload_notes([note])[0]
+            except Exception as e:
+                error = e
+            if error is not None:
+                self.log.error(f"Upload van notitie '{note['titel']}' mislukt: {error}")
+                self._on_upload_failed(note, error)
+            return
+        if not self.upload_queue.submit(note):
+            if self.journal is not None:
+                self._inflight.discard(note["id"])
+                self.log.error(f"Upload wachtrij vol, notitie '{note['titel']}' blijft in het journal")
+            else:
+                self.log.error(f"Upload wachtrij vol, notitie '{note['titel']}' niet opgeslagen")
+            return
+        self.log.debug(f"Notitie in upload wachtrij: {self.upload_queue.stats()}")
+
+    def _upload_notes(self, notes):
+        """Upload een batch notities in één SFTP sessie, geeft per notitie None of de fout"""
+        if self.journal is not None:
+            # Hier en niet bij ENDNOTE: de fsync houdt de bus thread niet op, één fsync per batch
+            self.journal.sync()
+        for note in notes:
+            # Eén keer renderen, ook als de upload later opnieuw geprobeerd wordt
+            if "prepared" not in note:
+                stream = note.pop("stream", None)
+                if stream is not None and self._commit_stream(note, stream):
+                    note["prepared"] = None
+                else:
+                    note["prepared"] = self._prepare_note(
+                        note["titel"], note["doel"], note["inhoud"], note["timestamp"], note.get("audio"))
+                if isinstance(note["inhoud"], NoteBuffer):
+                    note["inhoud"].close()
+                if self.journal is not None and "id" in note and note["prepared"] is not None:
+                    # Een resync schrijft dit terug, zonder de bijlage opnieuw te uploaden
+                    self.journal.prepared(note["id"], note["prepared"])
+        results = self._write_notes([note["prepared"] for note in notes])
+        if self.journal is not None:
+            succeeded = False
+            for note, error in zip(notes, results):
+                if error is None and "id" in note:
+                    self.journal.done(note["id"])
+                    self._inflight.discard(note["id"])
+                    succeeded = succeeded or note["prepared"] is not None
+            # De vault is weer bereikbaar: achtergebleven notities meteen meesturen
+            if succeeded and len(self._inflight) < self.journal.stats()["pending"]:
+                self._start_resync()
+        return results
+
+    def _commit_stream(self, note, stream):
+        """Rond een gestreamde notitie af, False als hij alsnog als geheel geüpload moet worden"""
+        if not note["inhoud"] or note.get("audio") != stream.audio:
+            # Leeg, of audio die pas na het openen kwam: als geheel uploaden, met de bijlage
+            stream.abort()
+            return False
+        digest = None
+        if self.dedup is not None:
+            digest = note_hash(note["titel"], note["doel"], note["inhoud"])
+            if not self.dedup.reserve(digest):
+                stream.abort()
+                self.metrics.inc("dedup_hits")
+                self.log.info(f"Dubbele notitie '{note['titel']}' overgeslagen, stream verwijderd")
+                return True
+        try:
+            if stream.audio:
+                # Eerst de bijlage, zodat de embed in de notitie meteen werkt
+                self._upload_attachment(stream.path, stream.audio)
+            error = stream.finish(self.settings.get("streaming", {}).get("timeout", 30))
+        except Exception:
+            if digest:
+                self.dedup.release(digest)
+            raise
+        if error is not None:
+            if digest:
+                self.dedup.release(digest)
+            self.metrics.inc("stream_failures")
+            return False
+        self.metrics.inc("notes_streamed")
+        self.metrics.inc("bytes_written", stream.bytes)
+        if self.vault_index is not None:
+            self.vault_index.add(stream.path, note["titel"])
+        if digest:
+            self.dedup.commit(digest, stream.path)
+        return True
+
+    def _on_upload_failed(self, note, error):
+        # Blijft in het journal staan, de volgende resync probeert het opnieuw
+        if self.journal is not None and "id" in note:
+            self.journal.failed(note["id"], error)
+        self._inflight.discard(note.get("id"))
+
+    def _start_resync(self, message=None):
+        if self.journal is None or self._resync_lock.locked():
+            return
+        threading.Thread(target=self._resync_journal, name="ObsidianResync", daemon=True).start()
+
+    def _resync_journal(self):
+        """Upload alle notities uit het journal die niet onderweg zijn in één batch, en compact het journal"""
+        if not self._resync_lock.acquire(blocking=False):
+            return
+        notes = []
+        try:
+            notes = [note for note in self.journal.pending() if note["id"] not in self._inflight]
+            if notes:
+                self.log.info(f"Resync van {len(notes)} notitie(s) uit het journal")
+                self._inflight.update(note["id"] for note in notes)
+                for note in notes:
+                    self._reserve_prepared(note)
+                try:
+                    results = self._upload_notes(notes)
+                except Exception as e:
+                    failed = [e]
+                    self._release_prepared(notes)
+                    # Renderen gaat op volgorde: alleen de notitie waarbij het misging telt als poging
+                    unprepared = [note for note in notes if "prepared" not in note]
+                    if unprepared:
+                        self.journal.failed(unprepared[0]["id"], e)
+                else:
+                    failed = [error for error in results if error is not None]
+                    for note, error in zip(notes, results):
+                        if error is not None:
+                            self.journal.failed(note["id"], error)
+                if failed:
+                    self.log.warning(f"Resync: {len(failed)} van {len(notes)} notitie(s) mislukt ({failed[0]})")
+            self.journal.compact()
+        finally:
+            self._inflight.difference_update(note["id"] for note in notes)
+            self._resync_lock.release()
+
+    def _reserve_prepared(self, note):
+        """Reserveer de hash van een al gerenderde notitie uit het journal opnieuw, de upload gaf hem vrij"""
+        prepared = note.get("prepared")
+        if not prepared or not prepared.get("hash") or self.dedup is None:
+            return
+        if not self.dedup.reserve(prepared["hash"]):
+            # Wel geschreven maar niet als klaar gemarkeerd, bv. bij een herstart op het verkeerde moment
+            self.metrics.inc("dedup_hits")
+            self.log.info(f"Notitie '{prepared['title']}' uit het journal staat al in de vault")
+            note["prepared"] = None
+
+    def _release_prepared(self, notes):
+        if self.dedup is None:
+            return
+        for note in notes:
+            if note.get("prepared") and note["prepared"].get("hash"):
+                self.dedup.release(note["prepared"]["hash"])
+
+    def handle_retry_request(self, message):
+        """obsidian.note.retry: probeer de opgegeven notities uit het journal opnieuw"""
+        if self.journal is None:
+            return
+        revived = self.journal.revive()
+        self.log.info(f"{revived} opgegeven notitie(s) uit het journal opnieuw in de resync")
+        if revived:
+            self._start_resync()
+
+    def handle_stats_request(self, message):
+        """Beantwoord obsidian.note.stats met tellers, latency per stap en wachtrij status"""
+        data = self.metrics.snapshot()
+        if self.upload_queue:
+            data["upload_queue"] = self.upload_queue.stats()
+        if self.intake is not None:
+            data["intake"] = self.intake.stats()
+        data["sessions"] = {"active": len(self.sessions), "evicted": self.sessions.evicted}
+        if self.dedup is not None:
+            data["dedup"] = self.dedup.stats()
+        if self.journal is not None:
+            data["journal"] = self.journal.stats()
+        if self.vault_index is not None:
+            data["vault_index"] = self.vault_index.stats()
+        if isinstance(self.storage, SFTPStorage):
+            data["dir_cache"] = self.storage.connection.dir_cache_stats()
+        elif isinstance(self.storage, ReplicatedStorage):
+            data["targets"] = self.storage.stats()
+        self.bus.emit(message.response(data))
+
+    def _export_metrics(self, message=None):
+        path = self.settings.get("metrics", {}).get("prometheus_file")
+        if not path:
+            return
+        if self.intake is not None:
+            self.metrics.set_gauge("intake_depth", self.intake.stats()["depth"])
+        try:
+            self.metrics.write_textfile(path)
+        except OSError as e:
+            self.log.warning(f"Prometheus export naar {path} mislukt: {e}")
 
     def _extract_field(self, text, label):
         pattern = rf"{label}\s*(.*)"
@@ -117,100 +646,462 @@ class ObsidianAddNoteSkill(OVOSSkill):
         return m.group(1).strip() if m else ""
 
     def get_weather(self):
-        """Haal korte weersomschrijving + temp op van OpenWeatherMap API"""
-        if not self.api_key:
-            LOG.debug("Geen OpenWeatherMap API key gevonden in settings")
+        """Haal korte weersomschrijving + temp op van OpenWeatherMap API (gecached)"""
+        # Met een achtergrond refresh wacht een notitie nooit op het netwerk
+        refreshing = bool(self.settings.get("weather_refresh", 0))
+        with self.metrics.timed("weather"):
+            return self.weather.get(self.city, allow_stale=refreshing)
+
+    def _cached_weather(self):
+        """Het weer uit de cache, None als het opgehaald moet worden"""
+        return self.weather.cached(self.city, allow_stale=bool(self.settings.get("weather_refresh", 0)))
+
+    def _weather_and_warm_up(self):
+        """Haal het weer op terwijl de opslag verbindt; het weer krijgt hooguit weather_deadline seconden"""
+        if self._pipeline is None:
+            return self.get_weather()
+        self._request_warm_up()
+        # Een geldige waarde in de cache hoeft niet via de pipeline
+        weather = self._cached_weather()
+        if weather is not None:
+            self.metrics.observe("weather", 0.0)
+            return weather
+        future = self._weather_request()
+        deadline = self.settings.get("weather_deadline", 2.0)
+        try:
+            return future.result(timeout=deadline)
+        except FutureTimeout:
+            # De aanvraag loopt door en vult de cache voor de volgende notitie
+            self.metrics.inc("weather_timeouts")
+            self.log.warning(f"Weer niet binnen {deadline}s opgehaald, notitie zonder weer")
             return "Onbekend"
+
+    def _weather_request(self):
+        """Future voor het weer; een trage aanvraag die nog loopt wordt gedeeld in plaats van er een tweede achter te zetten"""
+        future = self._weather_future
+        if future is None or future.done():
+            future = self._weather_future = self._pipeline.submit(self.get_weather)
+        return future
+
+    def _request_warm_up(self):
+        """Future voor het klaarzetten van de opslag, gedeeld zolang er een loopt.
+
+        Staat de verbinding al open, dan wordt er niets klaargezet.
+        """
+        future = self._warm_up_future
+        if future is not None and not future.done():
+            self.metrics.inc("warm_ups_skipped")
+            return future
+        if self.storage is not None and self.storage.is_warm():
+            self.metrics.inc("warm_ups_skipped")
+            future = Future()
+            future.set_result(True)
+            return future
+        future = self._warm_up_future = self._warm_up_executor.submit(self._warm_up_storage)
+        return future
+
+    def _start_warm_up(self, session):
+        """Bij NOTE alvast het weer ophalen en de opslag verbinden, zodat ENDNOTE alleen nog rendert en schrijft"""
+        if not self.settings.get("warm_up", {}).get("enabled", True):
+            return
+        # Een vorige NOTE zonder ENDNOTE in deze sessie is verlaten
+        self._discard_warm_up(session)
+        if self.api_key and self._cached_weather() is None:
+            # Gedeeld met andere sessies en ENDNOTE, wordt dus niet geannuleerd; vult alleen de cache
+            self._weather_request()
+        session.warm = (time.perf_counter(), self._request_warm_up())
+        self.metrics.inc("warm_ups")
+
+    def _settle_warm_up(self, session):
+        """Tel bij ENDNOTE of de warm-up echt iets oplevert: klaar, gelukt en de verbinding nog open"""
+        started, future = session.warm
+        session.warm = None
+        self.metrics.observe("warm_lead", time.perf_counter() - started)
+        if not future.done():
+            outcome = "warm_ups_late"
+        elif future.cancelled() or future.exception() is not None or not future.result():
+            outcome = "warm_ups_failed"
+        elif self.storage is None or not self.storage.is_warm():
+            # Dicteren duurde langer dan ssh.idle_timeout
+            outcome = "warm_ups_expired"
+        else:
+            outcome = "warm_ups_used"
+        self.metrics.inc(outcome)
+
+    def _discard_warm_up(self, session):
+        """Warm-up van een verlaten notitie weggooien.
+
+        De warm-up wordt gedeeld met andere sessies en dus niet geannuleerd;
+        een open verbinding sluit via de idle timer en het weer verloopt via de TTL.
+        """
+        if session.warm is None:
+            return
+        session.warm = None
+        self.metrics.inc("warm_ups_wasted")
+
+    def _warm_up_storage(self):
+        """Verbind met de opslag en controleer de vault map, True als dat gelukt is"""
+        storage = self._get_storage()
+        if storage is None:
+            return False
         try:
-            url = f"http://api.openweathermap.org/data/2.5/weather?q={self.city}&lang=nl&units=metric&appid={self.api_key}"
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                desc = data["weather"][0]["description"]
-                temp = data["main"]["temp"]
-                return f"{desc}, {temp:.0f}°C"
-            else:
-                LOG.warning(f"Weer API gaf statuscode {response.status_code}")
+            storage.warm_up()
         except Exception as e:
-            LOG.warning(f"Weer ophalen mislukt: {e}")
-        return "Onbekend"
-
-    def create_markdown(self, title, goal, content, timestamp, origin, weather):
-        """Maak de markdown notitie met jouw template"""
-        weeknummer = timestamp.isocalendar()[1]
-        dagnaam = timestamp.strftime("%A")
-        maandnaam = timestamp.strftime("%B")
-        kwartaal = (timestamp.month - 1) // 3 + 1
-        jaar = timestamp.year
-
-        template = f"""# {title}
-
-*Categorie:* Dagverslag  
-Dag: {dagnaam}  
-Week: W{weeknummer}  
-Maand: {maandnaam}  
-Kwartaal: Q{kwartaal}  
-Jaar: {jaar}  
-
-## Deze dag:
-Weer: {weather}  
-Oorsprong: {origin}
-
-## Inhoud
-{content}
-"""
-        return template
-
-    def add_note(self, title, goal, content):
-        """Upload markdown via Paramiko SFTP"""
-        ssh_cfg = self.settings.get("ssh", {})
-        host = ssh_cfg.get("host")
-        port = ssh_cfg.get("port", 22)
-        username = ssh_cfg.get("username")
-        password = ssh_cfg.get("password")
-        remote_path = ssh_cfg.get("remote_path")
-
-        if not (host and username and remote_path):
-            LOG.error("SSH settings incompleet")
+            # De upload zelf probeert het opnieuw en rapporteert de fout
+            self.log.debug(f"Opslag vooraf klaarzetten mislukt: {e}")
+            return False
+        return True
+
+    def _refresh_weather(self, message=None):
+        self.weather.refresh(self.city)
+
+    def _template_values(self, timestamp, **values):
+        values.setdefault("related", "")
+        values.setdefault("attachments", "")
+        values.update(date_fields(timestamp.date()))
+        values["tijd"] = timestamp.strftime("%H:%M")
+        return values
+
+    def create_markdown(self, title, goal, content, timestamp, origin, weather, attachment=None):
+        """Maak de markdown notitie met jouw template; attachment is de naam van een geüploade bijlage"""
+        template = self.templates.get("note", self.settings)
+        return template.render(self._template_values(
+            timestamp, title=title, goal=goal, content=content, origin=origin, weather=weather,
+            related=self._related_links(title, goal),
+            attachments=f"![[{attachment}]]\n" if attachment else ""))
+
+    def create_daily_header(self, timestamp):
+        """Kop van de dagnotitie, alleen geschreven als het bestand nieuw is"""
+        template = self.templates.get("daily_header", self.settings)
+        return template.render(self._template_values(timestamp))
+
+    def create_daily_section(self, title, goal, content, timestamp, origin, weather, attachment=None):
+        """Sectie voor één notitie in de dagnotitie"""
+        template = self.templates.get("daily_section", self.settings)
+        return template.render(self._template_values(
+            timestamp, title=title, goal=goal, content=content, origin=origin, weather=weather,
+            related=self._related_links(title, goal),
+            attachments=f"![[{attachment}]]\n" if attachment else ""))
+
+    def _attachment_path(self, note_path, audio):
+        """Pad van de bijlage in de vault: de naam en map van de notitie met de extensie van het audiobestand"""
+        directory, name = posixpath.split(note_path)
+        name = os.path.splitext(name)[0] + os.path.splitext(audio)[1]
+        return posixpath.join(self.settings.get("attachments", {}).get("folder", ""), directory, name)
+
+    def _attachment_embed(self, note_path, audio):
+        if not audio:
+            return ""
+        return f"![[{posixpath.basename(self._attachment_path(note_path, audio))}]]\n"
+
+    def _audio_source_dir(self):
+        source_dir = self.settings.get("attachments", {}).get("source_dir")
+        return os.path.realpath(source_dir or os.path.join(self.file_system.path, "audio"))
+
+    def _audio_source(self, path):
+        """Het echte pad van een audiobestand, None als het buiten attachments.source_dir ligt.
+
+        Elke bus client kan een pad sturen; zonder deze controle zou elk
+        leesbaar bestand (bv. ~/.ssh/id_rsa) naar de vault gaan en met
+        delete_after_upload verwijderd worden.
+        """
+        real = os.path.realpath(path)
+        source_dir = self._audio_source_dir()
+        if os.path.commonpath([real, source_dir]) != source_dir:
+            self.log.warning(f"Audio {path} geweigerd, staat niet in attachments.source_dir ({source_dir})")
+            return None
+        return real
+
+    def _upload_attachment(self, note_path, audio):
+        """Stream het audiobestand naar de vault, geeft de naam voor de embed of None als het mislukt"""
+        storage = self._get_storage()
+        if storage is None:
+            return None
+        # Ook hier, voor audio uit het journal of een gewijzigde source_dir
+        audio = self._audio_source(audio)
+        if audio is None:
+            self.metrics.inc("attachments_failed")
+            return None
+        cfg = self.settings.get("attachments", {})
+        path = self._attachment_path(note_path, audio)
+        # Pas verwijderen als geen enkel target het bestand nog leest, ook achterblijvende replica's niet
+        on_done = (lambda: self._delete_audio(audio)) if cfg.get("delete_after_upload", False) else None
+        start = time.perf_counter()
+        try:
+            size = storage.upload_file(audio, path, chunk_size=cfg.get("chunk_size", 32768),
+                                       window=cfg.get("window", 64), on_done=on_done)
+        except Exception as e:
+            self.metrics.inc("attachments_failed")
+            self.log.error(f"Bijlage {audio} niet geüpload, notitie zonder audio: {e}")
+            return None
+        elapsed = time.perf_counter() - start
+        self.metrics.observe("attachment", elapsed)
+        self.metrics.inc("attachment_bytes", size)
+        self.log.info(f"Bijlage {path} geüpload: {size} bytes in {elapsed:.2f}s "
+                      f"({size / max(elapsed, 1e-6) / 1e6:.2f} MB/s)")
+        return posixpath.basename(path)
+
+    def _delete_audio(self, audio):
+        try:
+            os.remove(audio)
+        except OSError as e:
+            self.log.warning(f"Audiobestand {audio} niet verwijderd: {e}")
+
+    def _related_links(self, title, goal):
+        """Markdown blok met [[links]] naar verwante notities uit de vault index, of leeg"""
+        if self.vault_index is None:
+            return ""
+        limit = self.settings.get("vault_index", {}).get("max_links", 5)
+        names = self.vault_index.related(title, goal, limit=limit)
+        if not names:
+            return ""
+        return "## Gerelateerd\n" + "".join(f"- [[{name}]]\n" for name in names)
+
+    def _start_index_refresh(self, message=None):
+        if self.vault_index is None or self._index_lock.locked():
+            return
+        threading.Thread(target=self._refresh_index, name="ObsidianVaultIndex", daemon=True).start()
+
+    def _refresh_index(self):
+        """Werk de vault index bij; elke full_refresh_every keer worden ook ongewijzigde mappen gelist"""
+        if not self._index_lock.acquire(blocking=False):
             return
-        
+        try:
+            storage = self._get_storage()
+            if storage is None:
+                return
+            full_every = self.settings.get("vault_index", {}).get("full_refresh_every", 24)
+            full = bool(full_every) and self._index_refreshes % full_every == 0
+            self._index_refreshes += 1
+            start = time.perf_counter()
+            read = self.vault_index.refresh(storage, full=full)
+            self.metrics.observe("index_refresh", time.perf_counter() - start)
+            self.log.debug(f"Vault index bijgewerkt ({read} notities gelezen): {self.vault_index.stats()}")
+        except Exception as e:
+            self.log.warning(f"Vault index bijwerken mislukt: {e}")
+        finally:
+            self._index_lock.release()
+
+    def _on_settings_changed(self):
+        # Templates opnieuw compileren bij het volgende gebruik
+        self.templates.clear()
+        self._cache_settings()
+
+    def _cache_settings(self):
+        """Settings die bij elke utterance nodig zijn, één keer opgezocht in plaats van per event"""
+        self._max_note_size = self.settings.get("sessions", {}).get("max_note_size", 1024 * 1024)
+        self._content_spill_size = self.settings.get("content_spill_size", 256 * 1024)
+        self._track_in_progress = self.settings.get("journal", {}).get("in_progress", False)
+
+    def add_note(self, title, goal, content, timestamp=None):
+        """Upload markdown via Paramiko SFTP, een mislukte upload geeft een exception"""
+        error = self._write_notes([self._prepare_note(title, goal, content, timestamp)])[0]
+        if error is not None:
+            raise error
+
+    def _prepare_note(self, title, goal, content, timestamp=None, audio=None):
+        """Render een notitie naar markdown, None als de notitie onvolledig is"""
         if not all([title, goal, content]):
             self.log.warning("Cannot add note, missing fields")
-            return
-        self.log.info(f"Adding note:\nTitle: {title}\nGoal: {goal}\nContent:\n{content}")
+            return None
+        digest = None
+        if self.dedup is not None:
+            # Voor het weer en de upload, zodat een herhaling geen netwerk raakt
+            digest = note_hash(title, goal, content)
+            if not self.dedup.reserve(digest):
+                self.metrics.inc("dedup_hits")
+                self.log.info(f"Dubbele notitie '{title}' overgeslagen "
+                              f"(eerder opgeslagen als {self.dedup.lookup(digest) or 'onderweg'})")
+                return None
+        try:
+            return self._render_note(title, goal, content, timestamp, audio, digest)
+        except Exception:
+            # Anders blijft de hash gereserveerd en ziet de retry de notitie als dubbel
+            if digest:
+                self.dedup.release(digest)
+            raise
 
-        weather = self.get_weather()
-        timestamp = datetime.now()
-        markdown_text = self.create_markdown(title, goal, content, timestamp, "OVOS ObsidianAddNote Skill", weather)
-        filename_safe = f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{title.replace(' ', '_')}.md"
-        remote_file = os.path.join(remote_path, filename_safe)
+    def _render_note(self, title, goal, content, timestamp, audio, digest):
+        self.log.info(f"Adding note: {title} ({len(content)} tekens)")
+
+        weather = self._weather_and_warm_up()
+        timestamp = timestamp or datetime.now()
+        origin = ORIGIN
+        attachment = None
+        if audio:
+            attachment = self._upload_attachment(self._note_path(title, timestamp), audio)
+        if self.settings.get("daily_note", False):
+            # Alle notities van een dag als sectie in één bestand
+            with self.metrics.timed("render"):
+                return {
+                    "path": posixpath.join(self._shard_dir(timestamp), f"{timestamp.strftime('%Y-%m-%d')}.md"),
+                    "markdown": self.create_daily_section(title, goal, content, timestamp, origin, weather,
+                                                          attachment),
+                    "header": self.create_daily_header(timestamp),
+                    "mode": "a",
+                    "hash": digest,
+                    "title": title
+                }
+        with self.metrics.timed("render"):
+            markdown_text = self.create_markdown(title, goal, content, timestamp, origin, weather, attachment)
+        return {"path": self._note_path(title, timestamp), "markdown": markdown_text,
+                "hash": digest, "title": title}
+
+    @staticmethod
+    def _note_filename(title, timestamp):
+        return f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{title.replace(' ', '_')}.md"
 
+    def _note_path(self, title, timestamp):
+        """Pad van een notitie in de vault: de map volgens de layout setting plus de bestandsnaam"""
+        return posixpath.join(self._shard_dir(timestamp), self._note_filename(title, timestamp))
+
+    def _shard_dir(self, timestamp):
+        layout = self.settings.get("layout", "flat")
         try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            ssh.connect(host, port=port, username=username, password=password, timeout=10)
-            sftp = ssh.open_sftp()
+            return shard_dir(timestamp, layout)
+        except ValueError as e:
+            self.log.error(f"Layout setting ongeldig, notitie in de vault map zelf: {e}")
+            return ""
 
-            # Maak remote folder aan indien nodig
-            try:
-                sftp.chdir(remote_path)
-            except IOError:
-                dirs = remote_path.strip("/").split("/")
-                current = ""
-                for d in dirs:
-                    current += "/" + d
-                    try:
-                        sftp.chdir(current)
-                    except IOError:
-                        sftp.mkdir(current)
-                        sftp.chdir(current)
-
-            with sftp.file(remote_file, "w", -1) as f:
-                f.write(markdown_text)
-
-            sftp.close()
-            ssh.close()
-            self.log.info(f"Notitie opgeslagen via SFTP : {remote_file}")
+    def _write_notes(self, prepared):
+        """Schrijf voorbereide notities via de ingestelde opslag, per notitie None of de fout"""
+        if not any(prepared):
+            return [None] * len(prepared)
+        storage = self._get_storage()
+        if storage is None:
+            return [None] * len(prepared)
+        results = storage.write_notes(prepared)
+        for note, error in zip(prepared, results):
+            if note is None:
+                continue
+            if error is None:
+                self.metrics.inc("bytes_written", len(note["markdown"].encode("utf-8")))
+                if self.vault_index is not None and note.get("mode", "w") == "w":
+                    self.vault_index.add(note["path"], note["title"])
+            else:
+                self.metrics.inc("uploads_failed")
+            if self.dedup is not None and note.get("hash"):
+                if error is None:
+                    self.dedup.commit(note["hash"], note["path"])
+                else:
+                    self.dedup.release(note["hash"])
+        return results
 
-        except Exception as e:
-            self.log.error(f"SFTP upload mislukt: {e}")
+    def _get_storage(self):
+        """Geef de opslag uit de settings ("sftp", "local" of "memory"), opnieuw aangemaakt bij wijzigingen"""
+        # Ook aangeroepen vanuit de pipeline threads
+        with self._storage_lock:
+            return self._get_storage_locked()
+
+    def _get_storage_locked(self):
+        targets = self.settings.get("targets")
+        if targets:
+            # Meerdere vaults: de hele lijst plus de replicatie settings als sleutel
+            replication = self.settings.get("replication", {})
+            key = ("targets", repr(targets), repr(sorted(replication.items())))
+        else:
+            key = self._storage_config_key(self.settings)
+            if key is None:
+                return None
+        if self.storage is not None and self._storage_key == key:
+            return self.storage
+
+        if self.storage is not None:
+            self.storage.close()
+            self.storage = None
+        if targets:
+            storages = []
+            for i, cfg in enumerate(targets):
+                if self._storage_config_key(cfg) is None:
+                    LOG.error(f"Target {i} overgeslagen, settings incompleet")
+                    continue
+                storages.append((self._target_name(cfg, i), self._create_storage(cfg)))
+            if not storages:
+                return None
+            self.storage = ReplicatedStorage(
+                storages,
+                quorum=replication.get("quorum", 1),
+                max_retries=replication.get("max_retries", 3),
+                backoff=replication.get("backoff", 2.0),
+                metrics=self.metrics
+            )
+        else:
+            self.storage = self._create_storage(self.settings)
+        self._storage_key = key
+        return self.storage
+
+    @staticmethod
+    def _storage_config_key(cfg):
+        """Sleutel voor de opslag die cfg beschrijft, None als de settings incompleet zijn"""
+        backend = cfg.get("storage", "sftp")
+        if backend == "memory":
+            return ("memory",)
+        if backend == "local":
+            local_path = cfg.get("local_path")
+            if not local_path:
+                LOG.error("local_path ontbreekt in settings")
+                return None
+            return ("local", local_path)
+        ssh_cfg = cfg.get("ssh", {})
+        if not (ssh_cfg.get("host") and ssh_cfg.get("username") and ssh_cfg.get("remote_path")):
+            LOG.error("SSH settings incompleet")
+            return None
+        return ("sftp", ssh_cfg.get("host"), ssh_cfg.get("port", 22), ssh_cfg.get("username"),
+                ssh_cfg.get("password"), ssh_cfg.get("remote_path"),
+                ssh_cfg.get("keepalive", 30), ssh_cfg.get("idle_timeout", 300),
+                ssh_cfg.get("compress", False))
+
+    @staticmethod
+    def _target_name(cfg, index):
+        if cfg.get("name"):
+            return cfg["name"]
+        backend = cfg.get("storage", "sftp")
+        if backend == "sftp":
+            return cfg.get("ssh", {}).get("host", f"target{index}")
+        return f"{backend}{index}"
+
+    def _create_storage(self, cfg):
+        backend = cfg.get("storage", "sftp")
+        if backend == "memory":
+            return MemoryStorage()
+        if backend == "local":
+            return LocalStorage(cfg.get("local_path"), metrics=self.metrics)
+        ssh_cfg = cfg.get("ssh", {})
+        connection = SFTPConnectionManager(
+            ssh_cfg.get("host"),
+            port=ssh_cfg.get("port", 22),
+            username=ssh_cfg.get("username"),
+            password=ssh_cfg.get("password"),
+            keepalive=ssh_cfg.get("keepalive", 30),
+            idle_timeout=ssh_cfg.get("idle_timeout", 300),
+            compress=ssh_cfg.get("compress", False),
+            metrics=self.metrics
+        )
+        return SFTPStorage(connection, ssh_cfg.get("remote_path"))
+
+    def shutdown(self):
+        self._export_metrics()
+        if self.intake is not None:
+            # Eerst de wachtrij leeg verwerken, zodat afgeronde notities nog in de upload queue komen
+            self.intake.stop(drain=self.settings.get("intake", {}).get("drain_on_shutdown", True))
+            self.intake = None
+        if self.upload_queue:
+            drain = self.settings.get("upload_queue", {}).get("drain_on_shutdown", True)
+            self.upload_queue.stop(drain=drain)
+            self.upload_queue = None
+        if self._stream_executor is not None:
+            self._stream_executor.shutdown(wait=True)
+            self._stream_executor = None
+        if self._pipeline is not None:
+            self._pipeline.shutdown(wait=True)
+            self._pipeline = None
+        if self._warm_up_executor is not None:
+            self._warm_up_executor.shutdown(wait=True)
+            self._warm_up_executor = None
+        if self.weather:
+            self.weather.close()
+        if self.storage:
+            self.storage.close()
+            self.storage = None
+        if self.journal is not None:
+            self.journal.close()
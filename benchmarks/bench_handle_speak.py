@@ -0,0 +1,168 @@
+"""Micro-benchmark van handle_speak over een opgenomen event corpus.
+
+Vergelijkt de oorspronkelijke parser (upper()/lower() per check en een
+ongecompileerde regex per event) met de huidige handle_speak van de skill.
+Uploads worden niet uitgevoerd, alleen het parsen en de note state.
+Met --block worden dezelfde notities ook als compact NOTE blok in één
+utterance gemeten, in notities/s.
+
+    python benchmarks/bench_handle_speak.py --rounds 2000 [--block]
+"""
+import argparse
+import re
+import time
+
+from common import load_corpus, make_skill
+
+
+class LegacyParser:
+    """Kopie van de parser uit handle_speak vóór de gecompileerde classifier, inclusief logging"""
+
+    def __init__(self, log):
+        self.log = log
+        self.collecting_note = False
+        self.current_note = {"titel": None, "doel": None, "inhoud": ""}
+        self.await_field = None
+        self.finalized = 0
+
+    def _finalize(self):
+        self.log.info(f"ENDNOTE detected, finalizing note: {self.current_note}")
+        self.finalized += 1
+        self.collecting_note = False
+        self.current_note = {"titel": None, "doel": None, "inhoud": ""}
+        self.await_field = None
+
+    def handle(self, data):
+        utterance = data.get("utterance", "").strip()
+        meta = data.get("meta", {})
+        skill_source = meta.get("skill_id") or meta.get("skill")
+        if skill_source != "persona.openvoiceos":
+            return
+        self.log.debug(f"Received utterance: {utterance}")
+        if "NOTE" in utterance.upper() and "ENDNOTE" not in utterance.upper():
+            self.collecting_note = True
+            self.current_note = {"titel": None, "doel": None, "inhoud": ""}
+            self.await_field = None
+            self.log.info("NOTE detected, start collecting note")
+            return
+        if re.fullmatch(r"\[?ENDNOTE\]?", utterance.strip(), re.IGNORECASE):
+            self._finalize()
+            return
+        if not self.collecting_note:
+            return
+        if self.await_field:
+            if self.await_field == "inhoud":
+                if "ENDNOTE" in utterance.upper():
+                    content_part = utterance.replace("ENDNOTE", "").strip()
+                    if content_part:
+                        self.current_note["inhoud"] += content_part + "\n"
+                    self._finalize()
+                    return
+                else:
+                    self.current_note["inhoud"] += utterance.strip() + "\n"
+            else:
+                self.current_note[self.await_field] = utterance.strip()
+                self.await_field = None
+        else:
+            if utterance.lower().startswith("titel"):
+                self.await_field = "titel"
+            elif utterance.lower().startswith("doel"):
+                self.await_field = "doel"
+            elif utterance.lower().startswith("inhoud"):
+                self.await_field = "inhoud"
+        self.log.debug(f"Collecting note: {self.current_note}, awaiting field: {self.await_field}")
+
+
+class _Data:
+    """Minimale Message vervanger zodat alleen handle_speak gemeten wordt"""
+    __slots__ = ("data", "context")
+
+    def __init__(self, data):
+        self.data = data
+        self.context = {}
+
+
+def _as_blocks(corpus):
+    """Dezelfde events, met elke NOTE ... ENDNOTE reeks als één "NOTE Titel: ... ENDNOTE" utterance"""
+    events, current, field = [], None, None
+    for event in corpus:
+        utterance = event.get("utterance", "").strip()
+        upper = utterance.upper()
+        if current is None:
+            if "NOTE" in upper and "ENDNOTE" not in upper:
+                current, field = {"titel": "", "doel": "", "inhoud": []}, None
+            else:
+                events.append(event)
+            continue
+        if "ENDNOTE" in upper:
+            rest = utterance.replace("[ENDNOTE]", "").replace("ENDNOTE", "").strip()
+            if rest:
+                current["inhoud"].append(rest)
+            text = (f"NOTE Titel: {current['titel']}\nDoel: {current['doel']}\nInhoud:\n"
+                    + "\n".join(current["inhoud"]) + "\nENDNOTE")
+            events.append(dict(event, utterance=text))
+            current = None
+        elif field is None or (field != "inhoud" and utterance.lower() in ("titel", "doel", "inhoud")):
+            field = utterance.lower()
+        elif field == "inhoud":
+            current["inhoud"].append(utterance)
+        else:
+            current[field], field = utterance, None
+    return events
+
+
+def _run(handler, events, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for event in events:
+            handler(event)
+    elapsed = time.perf_counter() - start
+    return rounds * len(events) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--corpus", default="speak_events.jsonl")
+    parser.add_argument("--block", action="store_true", help="vergelijk ook met het compacte NOTE blok formaat")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+
+    # Zonder journal en warm-up: het journal record per afgeronde notitie en het verbinden bij NOTE zijn geen parse werk
+    skill, _ = make_skill({"upload_queue": {"enabled": False}, "journal": {"enabled": False},
+                           "warm_up": {"enabled": False}})
+    # NOTE/ENDNOTE info logs zouden de meting domineren
+    skill.log.setLevel("WARNING")
+
+    legacy = LegacyParser(skill.log)
+    before = _run(legacy.handle, corpus, args.rounds)
+
+    finalized = []
+    # Zoals _upload_notes: per notitie None of de fout
+    skill._upload_notes = lambda notes: finalized.extend(notes) or [None] * len(notes)
+    messages = [_Data(event) for event in corpus]
+    after = _run(skill.handle_speak, messages, args.rounds)
+    notes = len(finalized)
+
+    print(f"events in corpus : {len(corpus)}, rondes: {args.rounds}")
+    print(f"voor             : {before:12,.0f} events/s ({legacy.finalized} notities)")
+    print(f"na               : {after:12,.0f} events/s ({notes} notities)")
+    print(f"versnelling      : {after / before:.2f}x")
+
+    if args.block:
+        blocks = [_Data(event) for event in _as_blocks(corpus)]
+        finalized.clear()
+        block = _run(skill.handle_speak, blocks, args.rounds)
+        # Notities/s: hetzelfde aantal notities met veel minder events
+        per_event = after / len(messages) * notes / args.rounds
+        per_block = block / len(blocks) * len(finalized) / args.rounds
+        print(f"blok formaat     : {len(blocks)} events in plaats van {len(messages)}, "
+              f"{block:,.0f} events/s ({len(finalized)} notities)")
+        print(f"notities/s       : {per_event:12,.0f} per event vs {per_block:12,.0f} als blok "
+              f"({per_block / per_event:.1f}x)")
+    skill.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""End-to-end benchmark van de notitie pipeline.
+
+Speelt synthetische speak streams (NOTE, velden, inhoud, ENDNOTE) af via een
+FakeBus door ObsidianAddNoteSkill.handle_speak, met een lokale paramiko SFTP
+server en een weer endpoint als stand-in. Rapporteert finalize latency
+(ENDNOTE tot notitie opgeslagen), notities/s, geschreven bytes en tijd per stap.
+
+    python benchmarks/bench_pipeline.py --notes 50 --sftp-latency 0.02 --handshake-latency 0.3
+"""
+import argparse
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from ovos_bus_client.message import Message
+
+from common import make_skill
+from stubs import SFTPStubServer, WeatherStubServer
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+class StageTimer:
+    """Meet de totale tijd per pipeline stap door methodes van een object te wrappen"""
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, stage, elapsed):
+        with self._lock:
+            self.totals[stage] += elapsed
+            self.calls[stage] += 1
+
+    def wrap(self, obj, attr, stage):
+        func = getattr(obj, attr)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        setattr(obj, attr, timed)
+
+
+def speak_stream(index, lines):
+    """Utterances van één notitie zoals de persona ze uitspreekt"""
+    yield "NOTE"
+    yield "Titel"
+    yield f"Benchmark notitie {index}"
+    yield "Doel"
+    yield "Doorvoer van de notitie pipeline meten"
+    yield "Inhoud"
+    for n in range(lines):
+        yield f"Regel {n} van notitie {index}: de vergadering besprak planning, budget en risico's."
+    yield "ENDNOTE"
+
+
+def build_settings(args, sftp, weather, vault):
+    settings = {
+        "api_key": "benchmark",
+        "weather_url": weather.url,
+        "weather_ttl": args.weather_ttl,
+        "storage": args.storage,
+        "daily_note": args.daily_note,
+        "pipeline": {"enabled": not args.sequential},
+        "streaming": {"enabled": args.streaming},
+        "warm_up": {"enabled": not args.no_warm_up},
+        "weather_deadline": args.weather_deadline,
+        "upload_queue": {
+            "enabled": not args.sync,
+            "workers": args.workers,
+            "batch_size": args.batch_size,
+            "linger": args.linger,
+            "maxsize": max(50, args.notes)
+        }
+    }
+    if args.storage == "sftp":
+        settings["ssh"] = {"host": "127.0.0.1", "port": sftp.port, "username": "bench",
+                           "password": "bench", "remote_path": "/vault/notes",
+                           "idle_timeout": args.ssh_idle_timeout}
+    elif args.storage == "local":
+        settings["local_path"] = vault
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=20)
+    parser.add_argument("--lines", type=int, default=10, help="inhoud regels per notitie")
+    parser.add_argument("--interval", type=float, default=0.0,
+                        help="pauze tussen notities in seconden")
+    parser.add_argument("--line-interval", type=float, default=0.0,
+                        help="seconden tussen utterances, om een dictaat na te bootsen")
+    parser.add_argument("--storage", choices=("sftp", "local", "memory"), default="sftp")
+    parser.add_argument("--sftp-latency", type=float, default=0.0, help="per SFTP request")
+    parser.add_argument("--handshake-latency", type=float, default=0.0, help="per nieuwe SSH verbinding")
+    parser.add_argument("--ssh-idle-timeout", type=float, default=300,
+                        help="sluit de SFTP verbinding na zoveel seconden, laag = elke notitie een nieuwe handshake")
+    parser.add_argument("--weather-latency", type=float, default=0.0)
+    parser.add_argument("--weather-deadline", type=float, default=2.0)
+    parser.add_argument("--weather-ttl", type=float, default=1800)
+    parser.add_argument("--sync", action="store_true", help="zonder upload wachtrij")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--linger", type=float, default=0.2)
+    parser.add_argument("--sequential", action="store_true",
+                        help="weer, render en verbinden na elkaar in plaats van tegelijk")
+    parser.add_argument("--streaming", action="store_true", help="schrijf de notitie al tijdens het dicteren")
+    parser.add_argument("--no-warm-up", action="store_true",
+                        help="weer en verbinding pas bij ENDNOTE in plaats van al bij NOTE")
+    parser.add_argument("--daily-note", action="store_true")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    vault = tempfile.mkdtemp(prefix="obsidian-vault-")
+    sftp = SFTPStubServer(vault, latency=args.sftp_latency,
+                          handshake_latency=args.handshake_latency).start()
+    weather = WeatherStubServer(latency=args.weather_latency).start()
+    skill, bus = make_skill(build_settings(args, sftp, weather, vault))
+    skill.log.setLevel("WARNING")
+
+    stages = StageTimer()
+    stages.wrap(skill, "get_weather", "get_weather")
+    stages.wrap(skill, "create_markdown", "create_markdown")
+    stages.wrap(skill, "create_daily_section", "create_markdown")
+    stages.wrap(skill, "_write_notes", "write")
+
+    endnote_at = {}
+    finalize = []
+    done = threading.Event()
+    upload_notes = skill._upload_notes
+
+    def timed_upload(notes):
+        results = upload_notes(notes)
+        now = time.perf_counter()
+        for note, error in zip(notes, results):
+            # Een gestreamde notitie heeft geen prepared markdown meer
+            if error is None and "prepared" in note:
+                finalize.append(now - endnote_at[note["titel"]])
+        if len(finalize) >= args.notes:
+            done.set()
+        return results
+    skill._upload_notes = timed_upload
+    if skill.upload_queue:
+        skill.upload_queue.handler = timed_upload
+
+    meta = {"skill": "persona.openvoiceos"}
+    start = time.perf_counter()
+    for i in range(args.notes):
+        for utterance in speak_stream(i, args.lines):
+            message = Message("speak", {"utterance": utterance, "meta": meta})
+            if utterance == "ENDNOTE":
+                endnote_at[f"Benchmark notitie {i}"] = time.perf_counter()
+            t = time.perf_counter()
+            bus.emit(message)
+            stages.add("handle_speak", time.perf_counter() - t)
+            if args.line_interval:
+                time.sleep(args.line_interval)
+        if args.interval:
+            time.sleep(args.interval)
+    done.wait(args.timeout)
+    elapsed = time.perf_counter() - start
+    skill.shutdown()
+    sftp.stop()
+    weather.stop()
+
+    print(f"opslag            : {args.storage}, {'sync' if args.sync else 'wachtrij'}, "
+          f"batch {args.batch_size}, sftp latency {args.sftp_latency * 1000:.0f} ms, "
+          f"handshake {args.handshake_latency * 1000:.0f} ms, weer {args.weather_latency * 1000:.0f} ms")
+    print(f"notities          : {len(finalize)}/{args.notes} in {elapsed:.2f}s "
+          f"({len(finalize) / elapsed:.1f} notities/s)")
+    print(f"finalize latency  : p50 {percentile(finalize, 50) * 1000:.1f} ms, "
+          f"p95 {percentile(finalize, 95) * 1000:.1f} ms, p99 {percentile(finalize, 99) * 1000:.1f} ms")
+    print(f"bytes geschreven  : {skill.metrics.counters['bytes_written']} (server: {sftp.bytes_written}), "
+          f"SSH verbindingen: {sftp.connections}, weer requests: {weather.requests}")
+    counters = skill.metrics.counters
+    print(f"warm-up bij NOTE  : {counters['warm_ups']}x, gebruikt {counters['warm_ups_used']}, "
+          f"te laat {counters['warm_ups_late']}, mislukt {counters['warm_ups_failed']}, "
+          f"verlopen {counters['warm_ups_expired']}, verspild {counters['warm_ups_wasted']}, "
+          f"overgeslagen {counters['warm_ups_skipped']}")
+    print("tijd per stap     :")
+    for stage in ("handle_speak", "get_weather", "create_markdown", "write"):
+        total = stages.totals.get(stage, 0.0)
+        calls = stages.calls.get(stage, 0)
+        avg = total / calls * 1000 if calls else 0.0
+        print(f"  {stage:<16}: {total * 1000:9.1f} ms totaal, {calls:5d}x, {avg:8.3f} ms gemiddeld")
+    print("skill metrics     :")
+    for stage, values in skill.metrics.snapshot()["stages"].items():
+        print(f"  {stage:<16}: {values['count']:5d}x, p50 {values['p50_ms']:8.3f} ms, "
+              f"p95 {values['p95_ms']:8.3f} ms, max {values['max_ms']:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
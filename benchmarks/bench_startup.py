@@ -0,0 +1,89 @@
+"""Startup benchmark: importtijd en geheugen (RSS) van de skill module.
+
+Elke meting draait in een vers Python proces, zodat modules die al geladen
+zijn de meting niet vertekenen. Gemeten wordt het importeren van de skill
+module en het aanmaken + initialize() van de skill op een FakeBus, en welke
+zware modules daarna geladen zijn.
+
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --eager   # paramiko/requests vooraf laden, zoals voorheen
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("paramiko", "cryptography", "requests")
+
+# Draait in het child proces; print één JSON regel met de metingen
+CHILD = r"""
+import json, os, sys, time
+sys.path.insert(0, {bench_dir!r})
+
+def rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+import common  # noqa: E402  (alleen stdlib, telt niet mee)
+from ovos_workshop.skills.ovos import OVOSSkill  # noqa: E402,F401  (gedeeld met elke skill)
+base_rss = rss_kb()
+start = time.perf_counter()
+if {eager!r}:
+    import paramiko, requests  # noqa: E401,F401
+common.load_skill_package()
+import_s = time.perf_counter() - start
+import_rss = rss_kb()
+start = time.perf_counter()
+skill, bus = common.make_skill({settings!r})
+init_s = time.perf_counter() - start
+init_rss = rss_kb()
+skill.shutdown()
+print(json.dumps({{
+    "import_ms": import_s * 1000,
+    "init_ms": init_s * 1000,
+    "import_rss_kb": import_rss - base_rss,
+    "total_rss_kb": init_rss - base_rss,
+    "loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_once(eager, settings):
+    code = CHILD.format(bench_dir=os.path.dirname(os.path.abspath(__file__)),
+                        eager=eager, settings=settings, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="aantal verse processen (default 5)")
+    parser.add_argument("--eager", action="store_true",
+                        help="laad paramiko en requests vooraf, zoals bij een top-level import")
+    parser.add_argument("--prewarm", action="store_true", help="zet de prewarm setting aan")
+    args = parser.parse_args()
+
+    settings = {"upload_queue": {"enabled": False}, "prewarm": args.prewarm}
+    results = [run_once(args.eager, settings) for _ in range(args.runs)]
+
+    def median(key):
+        return statistics.median(r[key] for r in results)
+
+    print(f"runs: {args.runs}{' (eager imports)' if args.eager else ''}")
+    print(f"skill import:     {median('import_ms'):8.1f} ms  {median('import_rss_kb') / 1024:6.1f} MiB RSS")
+    print(f"import + init:    {median('import_ms') + median('init_ms'):8.1f} ms  "
+          f"{median('total_rss_kb') / 1024:6.1f} MiB RSS")
+    print(f"geladen modules:  {', '.join(results[-1]['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Gedeelde hulpfuncties voor de benchmarks: skill laden vanuit de source tree met een FakeBus"""
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+PACKAGE = "ovos_skill_obsidianaddnote"
+
+# Settings en skill data niet in de echte OVOS config van de gebruiker schrijven
+os.environ.setdefault("XDG_CONFIG_HOME", tempfile.mkdtemp(prefix="obsidian-bench-"))
+os.environ.setdefault("XDG_DATA_HOME", os.environ["XDG_CONFIG_HOME"])
+
+
+def load_skill_package():
+    """Importeer de skill vanuit de source tree, ook als hij niet geïnstalleerd is"""
+    if PACKAGE in sys.modules:
+        return sys.modules[PACKAGE]
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE, os.path.join(ROOT, "__init__.py"), submodule_search_locations=[ROOT])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_skill(settings=None):
+    """Maak een ObsidianAddNoteSkill op een FakeBus, geeft (skill, bus) terug"""
+    from ovos_utils.fakebus import FakeBus
+    module = load_skill_package()
+    bus = FakeBus()
+    skill = module.ObsidianAddNoteSkill(skill_id=f"obsidian-bench-{uuid.uuid4().hex[:8]}",
+                                        bus=bus, settings=settings or {})
+    return skill, bus
+
+
+def load_corpus(name="speak_events.jsonl"):
+    """Lees een opgenomen event corpus: één message.data dict per regel"""
+    with open(os.path.join(DATA_DIR, name), encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,192 @@
+"""Lokale stand-ins voor de Obsidian SFTP server en de OpenWeatherMap API, met instelbare latency"""
+import json
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import paramiko
+from paramiko import (AUTH_SUCCESSFUL, OPEN_SUCCEEDED, SFTP_OK, SFTPAttributes,
+                      SFTPHandle, SFTPServer, SFTPServerInterface, ServerInterface)
+
+
+class _StubSSHServer(ServerInterface):
+    """Accepteert elke gebruiker met een wachtwoord"""
+
+    def check_auth_password(self, username, password):
+        return AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return OPEN_SUCCEEDED
+
+
+class _StubHandle(SFTPHandle):
+    def __init__(self, server, flags=0):
+        super().__init__(flags)
+        self.server = server
+
+    def stat(self):
+        return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+    def write(self, offset, data):
+        self.server.delay()
+        self.server.bytes_written += len(data)
+        return super().write(offset, data)
+
+
+class _StubSFTP(SFTPServerInterface):
+    """SFTP op een lokale map, elke request wacht eerst server.latency seconden"""
+
+    def __init__(self, server, *args, stub=None, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.stub = stub
+
+    def _path(self, path):
+        return os.path.join(self.stub.root, self.canonicalize(path).lstrip("/"))
+
+    def canonicalize(self, path):
+        return os.path.normpath(path if path.startswith("/") else "/" + path)
+
+    def _call(self, func, *args):
+        self.stub.delay()
+        try:
+            return func(*args)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        return self._call(lambda: SFTPAttributes.from_stat(os.stat(self._path(path))))
+
+    lstat = stat
+
+    def list_folder(self, path):
+        def listing():
+            out = []
+            real = self._path(path)
+            for name in os.listdir(real):
+                attr = SFTPAttributes.from_stat(os.stat(os.path.join(real, name)))
+                attr.filename = name
+                out.append(attr)
+            return out
+        return self._call(listing)
+
+    def open(self, path, flags, attr):
+        def do_open():
+            real = self._path(path)
+            fd = os.open(real, flags, 0o644)
+            if flags & os.O_WRONLY:
+                mode = "ab" if flags & os.O_APPEND else "wb"
+            elif flags & os.O_RDWR:
+                mode = "a+b" if flags & os.O_APPEND else "r+b"
+            else:
+                mode = "rb"
+            handle = _StubHandle(self.stub, flags)
+            handle.filename = real
+            handle.readfile = handle.writefile = os.fdopen(fd, mode)
+            return handle
+        return self._call(do_open)
+
+    def mkdir(self, path, attr):
+        return self._call(lambda: os.mkdir(self._path(path)) or SFTP_OK)
+
+    def rmdir(self, path):
+        return self._call(lambda: os.rmdir(self._path(path)) or SFTP_OK)
+
+    def remove(self, path):
+        return self._call(lambda: os.remove(self._path(path)) or SFTP_OK)
+
+    def rename(self, oldpath, newpath):
+        return self._call(lambda: os.rename(self._path(oldpath), self._path(newpath)) or SFTP_OK)
+
+    def posix_rename(self, oldpath, newpath):
+        return self._call(lambda: os.replace(self._path(oldpath), self._path(newpath)) or SFTP_OK)
+
+
+class SFTPStubServer:
+    """Paramiko SFTP server op 127.0.0.1 die in root schrijft.
+
+    latency wordt per SFTP request toegevoegd, handshake_latency eenmalig per
+    nieuwe verbinding, om een vault host via WAN na te bootsen.
+    """
+
+    def __init__(self, root, latency=0.0, handshake_latency=0.0):
+        self.root = root
+        self.latency = latency
+        self.handshake_latency = handshake_latency
+        self.connections = 0
+        self.bytes_written = 0
+        self._key = paramiko.RSAKey.generate(2048)
+        self._sock = socket.socket()
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(16)
+        self._transports = []
+        self.port = self._sock.getsockname()[1]
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def start(self):
+        threading.Thread(target=self._accept, name="SFTPStub", daemon=True).start()
+        return self
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            if self.handshake_latency:
+                time.sleep(self.handshake_latency)
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(self._key)
+            transport.set_subsystem_handler("sftp", SFTPServer, _StubSFTP, stub=self)
+            transport.start_server(server=_StubSSHServer())
+            self._transports.append(transport)
+
+    def stop(self):
+        self._sock.close()
+        for transport in self._transports:
+            transport.close()
+
+
+class WeatherStubServer:
+    """HTTP endpoint met een vast OpenWeatherMap antwoord na latency seconden"""
+
+    def __init__(self, latency=0.0):
+        stub = self
+        self.latency = latency
+        self.requests = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = json.dumps({"weather": [{"description": "licht bewolkt"}],
+                                   "main": {"temp": 14.6}}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/data/2.5/weather"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="WeatherStub", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
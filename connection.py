@@ -0,0 +1,247 @@
+import errno
+import posixpath
+import threading
+import time
+from ovos_utils.log import LOG
+from .metrics import NoteMetrics
+
+
+class SFTPConnectionManager:
+    """Houdt één SSH transport + SFTP kanaal open en hergebruikt dit over notities heen"""
+
+    def __init__(self, host, port=22, username=None, password=None,
+                 keepalive=30, idle_timeout=300, connect_timeout=10, compress=False, metrics=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.compress = compress
+        self.metrics = metrics or NoteMetrics()
+        self._lock = threading.RLock()
+        self._ssh = None
+        self._sftp = None
+        self._idle_timer = None
+        self._last_used = 0.0
+        # Remote mappen waarvan we weten dat ze bestaan, per verbinding
+        self.known_dirs = set()
+        self.dir_cache_hits = 0
+        self.dir_cache_misses = 0
+        # Bestanden waarvan we weten dat ze al een header hebben (append modus)
+        self.known_files = set()
+
+    @property
+    def config(self):
+        return (self.host, self.port, self.username, self.password,
+                self.keepalive, self.idle_timeout, self.compress)
+
+    def is_alive(self):
+        """True als het transport nog actief is"""
+        if self._ssh is None or self._sftp is None:
+            return False
+        transport = self._ssh.get_transport()
+        return transport is not None and transport.is_active()
+
+    def _connect(self):
+        # paramiko (en cryptography) pas laden bij de eerste verbinding, niet bij het laden van de skill
+        import paramiko
+        self._close_locked()
+        with self.metrics.timed("connect"):
+            ssh = paramiko.SSHClient()
+            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            ssh.connect(self.host, port=self.port, username=self.username,
+                        password=self.password, timeout=self.connect_timeout, compress=self.compress)
+            if self.keepalive:
+                ssh.get_transport().set_keepalive(self.keepalive)
+            self._ssh = ssh
+            self._sftp = ssh.open_sftp()
+        self.known_dirs.clear()
+        self.known_files.clear()
+        LOG.info(f"SFTP verbinding geopend met {self.host}:{self.port}")
+
+    def run(self, func):
+        """Voer func(sftp) uit op de gedeelde verbinding.
+
+        Is het transport onderweg weggevallen, dan wordt één keer opnieuw
+        verbonden en func nogmaals uitgevoerd. Fouten op een levende
+        verbinding (bv. een ongeldig pad) worden gewoon doorgegeven.
+        """
+        with self._lock:
+            try:
+                for attempt in (1, 2):
+                    if not self.is_alive():
+                        self._connect()
+                    try:
+                        return func(self._sftp)
+                    except Exception as e:
+                        if attempt == 2 or self.is_alive():
+                            raise
+                        LOG.warning(f"SFTP verbinding verbroken ({e}), opnieuw verbinden")
+            finally:
+                self._last_used = time.monotonic()
+                # Eén timer die zichzelf verlengt, niet per aanroep een nieuwe thread
+                if self._idle_timer is None:
+                    self._schedule_idle_close(self.idle_timeout)
+
+    def ensure_dir(self, sftp, path):
+        """Zorg dat de remote map bestaat; bekende mappen kosten geen round trip"""
+        path = "/" + path.strip("/")
+        if path in self.known_dirs:
+            self.dir_cache_hits += 1
+            return
+        self.dir_cache_misses += 1
+        with self.metrics.timed("dir_probe"):
+            parent = posixpath.dirname(path)
+            if parent in self.known_dirs:
+                # Nieuwe map onder een bekende map (bv. de shard van vandaag): in één round trip aanmaken
+                try:
+                    sftp.mkdir(path)
+                    self.known_dirs.add(path)
+                    return
+                except IOError:
+                    # Bestaat al, of de bekende map is remote weg: hieronder gewoon controleren
+                    self.forget_dir(parent)
+            try:
+                sftp.stat(path)
+            except IOError:
+                current = ""
+                for d in path.strip("/").split("/"):
+                    current += "/" + d
+                    if current in self.known_dirs:
+                        continue
+                    try:
+                        sftp.stat(current)
+                    except IOError:
+                        sftp.mkdir(current)
+                    self.known_dirs.add(current)
+        self.known_dirs.add(path)
+
+    def forget_dir(self, path):
+        """Vergeet een map, zijn bovenliggende mappen en alles eronder.
+
+        Als een map remote verwijderd is kan dat ook voor een bovenliggende
+        map gelden, die worden dus bij de volgende ensure_dir opnieuw gecontroleerd.
+        """
+        path = "/" + path.strip("/")
+        self.known_dirs = {d for d in self.known_dirs
+                           if not (path + "/").startswith(d + "/")
+                           and not d.startswith(path + "/")}
+
+    def open_file(self, sftp, remote_file, mode="w", bufsize=-1):
+        """Open remote_file voor schrijven, maak de map aan indien nodig.
+
+        Als de map in de cache staat maar remote toch niet (meer) bestaat,
+        wordt de cache voor die map geleegd en één keer opnieuw geprobeerd.
+        """
+        remote_dir = posixpath.dirname(remote_file)
+        self.ensure_dir(sftp, remote_dir)
+        try:
+            f = sftp.file(remote_file, mode, bufsize)
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            LOG.debug(f"Remote map {remote_dir} bestaat niet meer, opnieuw aanmaken")
+            self.forget_dir(remote_dir)
+            self.ensure_dir(sftp, remote_dir)
+            f = sftp.file(remote_file, mode, bufsize)
+        # Niet per write op een ack wachten, close() controleert de status
+        f.set_pipelined(True)
+        return f
+
+    def write_file(self, sftp, remote_file, data, mode="w", header=None):
+        """Schrijf data naar remote_file (zie open_file).
+
+        In append modus ("a") wordt header alleen geschreven als het bestand
+        nog leeg is.
+        """
+        start = time.perf_counter()
+        with self.open_file(sftp, remote_file, mode) as f:
+            if header and remote_file not in self.known_files:
+                if "a" not in mode or f.stat().st_size == 0:
+                    f.write(header)
+                self.known_files.add(remote_file)
+            f.write(data)
+        self.metrics.observe("write", time.perf_counter() - start)
+
+    def upload_file(self, sftp, local_path, remote_file, chunk_size=32768, window=64):
+        """Stream een lokaal bestand in blokken van chunk_size naar remote_file, geeft het aantal bytes.
+
+        De blokken worden gepipelined verstuurd; elke window blokken gaat er één
+        zonder pipelining, die wacht tot de server alle openstaande writes
+        bevestigd heeft, zodat er nooit meer dan window blokken onderweg zijn.
+        Het bestand wordt als verborgen .part bestand geschreven en pas daarna
+        hernoemd.
+        """
+        directory, name = posixpath.split(remote_file)
+        part_file = posixpath.join(directory, f".{name}.part")
+        written = 0
+        try:
+            # Ongebufferd: elk blok gaat direct als write request(s) de deur uit
+            with open(local_path, "rb") as src, self.open_file(sftp, part_file, "w", 0) as f:
+                chunks = 0
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    chunks += 1
+                    drain = window and chunks % window == 0
+                    if drain:
+                        f.set_pipelined(False)
+                    f.write(chunk)
+                    if drain:
+                        f.set_pipelined(True)
+                    written += len(chunk)
+            sftp.posix_rename(part_file, remote_file)
+        except Exception:
+            try:
+                sftp.remove(part_file)
+            except IOError:
+                pass
+            raise
+        return written
+
+    def dir_cache_stats(self):
+        return {"hits": self.dir_cache_hits, "misses": self.dir_cache_misses,
+                "known": len(self.known_dirs)}
+
+    def _schedule_idle_close(self, delay):
+        if not self.idle_timeout or not self.is_alive():
+            return
+        self._idle_timer = threading.Timer(delay, self._idle_close)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _cancel_idle_timer(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _idle_close(self):
+        with self._lock:
+            self._idle_timer = None
+            idle = time.monotonic() - self._last_used
+            if idle < self.idle_timeout:
+                # Intussen gebruikt, opnieuw plannen voor de resterende tijd
+                self._schedule_idle_close(self.idle_timeout - idle)
+                return
+            LOG.debug(f"SFTP verbinding met {self.host} idle, sluiten")
+            self._close_locked()
+
+    def _close_locked(self):
+        for conn in (self._sftp, self._ssh):
+            if conn is None:
+                continue
+            try:
+                conn.close()
+            except Exception as e:
+                LOG.debug(f"Sluiten SFTP verbinding mislukt: {e}")
+        self._sftp = None
+        self._ssh = None
+
+    def close(self):
+        """Sluit de verbinding, bv. bij shutdown van de skill"""
+        with self._lock:
+            self._cancel_idle_timer()
+            self._close_locked()
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from ovos_utils.log import LOG
+
+
+class _HashWriter:
+    """Laat een NoteBuffer zijn inhoud direct in een hash streamen"""
+
+    def __init__(self, digest):
+        self.digest = digest
+
+    def write(self, text):
+        self.digest.update(text.encode("utf-8"))
+
+
+def note_hash(title, goal, content):
+    """sha256 over titel, doel en inhoud; content mag een str of NoteBuffer zijn"""
+    digest = hashlib.sha256()
+    digest.update(f"{title}\0{goal}\0".encode("utf-8"))
+    if hasattr(content, "write_to"):
+        content.write_to(_HashWriter(digest))
+    else:
+        digest.update(content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class DedupIndex:
+    """Hashes van recent opgeslagen notities, bewaard in een JSON bestand.
+
+    Een hash telt als dubbel zolang hij jonger is dan window seconden. Hooguit
+    max_entries hashes worden bewaard, de oudste valt er als eerste uit.
+    reserve() markeert een notitie die nog onderweg is, zodat een herhaling
+    in dezelfde batch ook herkend wordt; commit() of release() na de upload.
+    """
+
+    def __init__(self, path=None, window=3600, max_entries=1000):
+        self.path = path
+        self.window = window
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()  # hash -> (opgeslagen op, pad)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.hits = 0
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            LOG.warning(f"Dedup index {self.path} niet gelezen, opnieuw begonnen: {e}")
+            return
+        for digest, stored, path in sorted(entries, key=lambda e: e[1])[-self.max_entries:]:
+            self._entries[digest] = (stored, path)
+
+    def _expire(self, now):
+        # Oudste staan vooraan
+        while self._entries:
+            stored = next(iter(self._entries.values()))[0]
+            if now - stored < self.window:
+                break
+            self._entries.popitem(last=False)
+
+    def reserve(self, digest):
+        """False als de notitie binnen het window al opgeslagen of onderweg is"""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if digest in self._entries or digest in self._pending:
+                self.hits += 1
+                return False
+            self._pending.add(digest)
+            return True
+
+    def lookup(self, digest):
+        """Pad van de eerder opgeslagen notitie met deze hash, of None"""
+        entry = self._entries.get(digest)
+        return entry[1] if entry else None
+
+    def commit(self, digest, path):
+        # Snapshot en schrijven onder dezelfde lock, zodat een oudere snapshot nooit de laatste is
+        with self._save_lock:
+            with self._lock:
+                self._pending.discard(digest)
+                self._entries.pop(digest, None)
+                self._entries[digest] = (time.time(), path)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                entries = [[d, stored, p] for d, (stored, p) in self._entries.items()]
+            self._save(entries)
+
+    def release(self, digest):
+        with self._lock:
+            self._pending.discard(digest)
+
+    def _save(self, entries):
+        if not self.path:
+            return
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            LOG.warning(f"Dedup index niet opgeslagen: {e}")
+
+    def stats(self):
+        return {"entries": len(self._entries), "pending": len(self._pending), "hits": self.hits}
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,167 @@
+import queue
+import threading
+import zlib
+from collections import deque
+from ovos_utils.log import LOG
+
+_STOP = object()
+OVERFLOW_POLICIES = ("block", "spill", "drop")
+
+
+class _Shard:
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        # Overloop bij policy "spill"; zolang hier iets staat gaat alles hierheen, voor de volgorde
+        self.spill = deque()
+        self.lock = threading.Lock()
+        self.thread = None
+
+
+class NoteIntake:
+    """Begrensde wachtrij tussen de messagebus en de verwerking van utterances.
+
+    Events worden per session id over `workers` consumer threads verdeeld,
+    zodat de volgorde per sessie behouden blijft. Is de wachtrij vol, dan
+    bepaalt overflow wat er gebeurt: "block" laat de bus hooguit block_timeout
+    seconden wachten, "spill" zet het event in een onbegrensde overloop die
+    daarna op volgorde verwerkt wordt, "drop" gooit het event weg.
+    is_relevant(session_id, utterance) wordt alleen bij een volle wachtrij
+    gevraagd; events die niet bij een notitie horen worden dan meteen weggegooid.
+    """
+
+    def __init__(self, handler, maxsize=1000, workers=1, overflow="block", block_timeout=5.0,
+                 is_relevant=None, metrics=None, name="ObsidianIntake"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"onbekende overflow policy {overflow!r}, kies uit {OVERFLOW_POLICIES}")
+        self.handler = handler
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.is_relevant = is_relevant
+        self.metrics = metrics
+        self.name = name
+        self._shards = [_Shard(maxsize) for _ in range(max(1, int(workers)))]
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._stats = {"submitted": 0, "processed": 0, "dropped": 0, "spilled": 0, "blocked": 0,
+                       "depth_max": 0}
+
+    def start(self):
+        for i, shard in enumerate(self._shards):
+            shard.thread = threading.Thread(target=self._run, args=(shard,),
+                                            name=f"{self.name}-{i}", daemon=True)
+            shard.thread.start()
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def _shard(self, session_id):
+        if len(self._shards) == 1:
+            return self._shards[0]
+        return self._shards[zlib.crc32(session_id.encode("utf-8")) % len(self._shards)]
+
+    def submit(self, session_id, utterance, *args):
+        """Zet een event in de wachtrij van zijn sessie, False als het weggegooid is.
+
+        Extra args gaan mee naar de handler: handler(session_id, utterance, *args).
+        """
+        if self._stopping:
+            return False
+        shard = self._shard(session_id)
+        item = (session_id, utterance, *args)
+        with shard.lock:
+            if not shard.spill:
+                try:
+                    shard.queue.put_nowait(item)
+                    self._submitted(shard)
+                    return True
+                except queue.Full:
+                    pass
+            if shard.spill or self.overflow == "spill":
+                if self.is_relevant is None or self.is_relevant(session_id, utterance):
+                    shard.spill.append(item)
+                    self._count("spilled")
+                    self._submitted(shard)
+                    return True
+                return self._drop(session_id, "geen notitie")
+        if self.is_relevant is not None and not self.is_relevant(session_id, utterance):
+            return self._drop(session_id, "geen notitie")
+        if self.overflow == "block":
+            self._count("blocked")
+            try:
+                shard.queue.put(item, timeout=self.block_timeout)
+                self._submitted(shard)
+                return True
+            except queue.Full:
+                pass
+        return self._drop(session_id, "wachtrij vol")
+
+    def _submitted(self, shard):
+        depth = shard.queue.qsize() + len(shard.spill)
+        with self._lock:
+            self._stats["submitted"] += 1
+            if depth > self._stats["depth_max"]:
+                self._stats["depth_max"] = depth
+
+    def _drop(self, session_id, reason):
+        self._count("dropped")
+        if self.metrics is not None:
+            self.metrics.inc("intake_dropped")
+        LOG.debug(f"Event van sessie {session_id} weggegooid ({reason})")
+        return False
+
+    def _run(self, shard):
+        while True:
+            item = shard.queue.get()
+            if item is _STOP:
+                with shard.lock:
+                    spilled = list(shard.spill)
+                    shard.spill.clear()
+                for spilled_item in spilled:
+                    self._process(spilled_item)
+                return
+            self._process(item)
+            # Na een lege wachtrij de overloop op volgorde verwerken
+            while shard.queue.empty():
+                with shard.lock:
+                    if not shard.spill:
+                        break
+                    spilled_item = shard.spill.popleft()
+                self._process(spilled_item)
+
+    def _process(self, item):
+        try:
+            self.handler(*item)
+        except Exception as e:
+            LOG.exception(f"Verwerken van event uit de intake wachtrij mislukt: {e}")
+        self._count("processed")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["depth"] = sum(shard.queue.qsize() + len(shard.spill) for shard in self._shards)
+        return stats
+
+    def stop(self, drain=True, timeout=10):
+        """Stop de consumers; met drain worden de events in de wachtrij eerst nog verwerkt"""
+        self._stopping = True
+        for shard in self._shards:
+            if not drain:
+                with shard.lock:
+                    dropped = len(shard.spill)
+                    shard.spill.clear()
+                while True:
+                    try:
+                        shard.queue.get_nowait()
+                        dropped += 1
+                    except queue.Empty:
+                        break
+                if dropped:
+                    self._count("dropped", dropped)
+                    if self.metrics is not None:
+                        self.metrics.inc("intake_dropped", dropped)
+            shard.queue.put(_STOP)
+        for shard in self._shards:
+            if shard.thread is not None:
+                shard.thread.join(timeout)
+                shard.thread = None
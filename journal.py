@@ -0,0 +1,237 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from ovos_utils.log import LOG
+from .note_buffer import NoteBuffer
+
+
+class NoteJournal:
+    """Append-only write-ahead journal van afgeronde notities, als JSON regels.
+
+    Een afgeronde notitie wordt eerst in het journal gezet en pas na een
+    gelukte upload als "done" gemarkeerd, zodat hij een mislukte upload of
+    een herstart overleeft. add_note() schrijft alleen naar de OS cache, de
+    fsync volgt in sync() op de upload thread voordat de upload begint; een
+    crash van de skill verliest zo niets, alleen een crash van het OS in die
+    paar ms. Eén sync() dekt alle notities die sindsdien geschreven zijn.
+    Optioneel worden ook de utterances van notities
+    die nog gedicteerd worden bijgehouden (zonder fsync), zodat die na een
+    herstart opnieuw afgespeeld kunnen worden. compact() herschrijft het
+    bestand met alleen wat nog open staat.
+
+    De gerenderde notitie wordt bij het record bewaard, zodat een resync de
+    bijlage niet opnieuw uploadt en de embed niet kwijt is als de audio al
+    verwijderd is. Na max_attempts mislukte pogingen gaat een notitie naar
+    de dead-letter lijst: hij blijft in het bestand maar wordt niet meer
+    geprobeerd tot revive().
+    """
+
+    def __init__(self, path, compact_after=50, max_attempts=10):
+        self.path = path
+        self.compact_after = compact_after
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()  # id -> notitie record
+        self._dead = OrderedDict()  # id -> notitie record, opgegeven
+        self._open = {}  # session id -> utterances sinds NOTE
+        self._done_since_compact = 0
+        self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._unsynced = False
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        for number, line in enumerate(lines, 1):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Een half geschreven laatste regel na een crash
+                LOG.warning(f"Journal regel {number} onleesbaar, overgeslagen")
+                continue
+            self._apply(record)
+        if self._pending or self._open:
+            LOG.info(f"Journal geladen: {len(self._pending)} notitie(s) nog niet geüpload, "
+                     f"{len(self._open)} onafgemaakte notitie(s)")
+        if self._dead:
+            LOG.warning(f"Journal bevat {len(self._dead)} opgegeven notitie(s), zie obsidian.note.retry")
+
+    def _apply(self, record):
+        op = record.get("op")
+        if op == "note":
+            # Na compact() staan opgegeven notities als "note" met dead erbij
+            (self._dead if record.get("dead") else self._pending)[record["id"]] = record
+        elif op == "done":
+            self._pending.pop(record["id"], None)
+        elif op == "prepared":
+            note = self._pending.get(record["id"])
+            if note is not None:
+                note["prepared"] = record["prepared"]
+        elif op in ("failed", "dead"):
+            note = self._pending.get(record["id"])
+            if note is not None:
+                note["attempts"] = note.get("attempts", 0) + 1
+                note["error"] = record.get("error")
+                if op == "dead":
+                    note["dead"] = True
+                    self._dead[record["id"]] = self._pending.pop(record["id"])
+        elif op == "revive":
+            note = self._dead.pop(record["id"], None)
+            if note is not None:
+                note.pop("dead", None)
+                note["attempts"] = 0
+                self._pending[record["id"]] = note
+        elif op == "begin":
+            self._open[record["session"]] = [record["text"]]
+        elif op == "utt":
+            self._open.setdefault(record["session"], []).append(record["text"])
+        elif op == "end":
+            self._open.pop(record["session"], None)
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file.closed:
+                return
+            self._apply(record)
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced = True
+
+    def sync(self):
+        """fsync wat sinds de vorige sync geschreven is, zonder append() op te houden"""
+        with self._lock:
+            if self._file.closed or not self._unsynced:
+                return
+            self._unsynced = False
+            # Een kopie van de fd blijft geldig als compact() het bestand intussen vervangt
+            fd = os.dup(self._file.fileno())
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def add_note(self, note_id, note):
+        """Leg een afgeronde notitie vast voordat hij geüpload wordt, sync() maakt hem duurzaam"""
+        content = note["inhoud"]
+        if isinstance(content, NoteBuffer):
+            content = content.getvalue()
+        record = {
+            "op": "note",
+            "id": note_id,
+            "titel": note["titel"],
+            "doel": note["doel"],
+            "inhoud": content,
+            "timestamp": note["timestamp"].isoformat()
+        }
+        if note.get("audio"):
+            record["audio"] = note["audio"]
+        self._append(record)
+
+    def prepared(self, note_id, prepared):
+        """Bewaar de gerenderde notitie (pad, markdown, ...) zodat een resync niet opnieuw rendert"""
+        with self._lock:
+            if note_id not in self._pending:
+                return
+        self._append({"op": "prepared", "id": note_id, "prepared": prepared})
+
+    def failed(self, note_id, error=None):
+        """Tel een mislukte upload, True als de notitie daarmee opgegeven is"""
+        with self._lock:
+            note = self._pending.get(note_id)
+            if note is None:
+                return False
+            dead = bool(self.max_attempts) and note.get("attempts", 0) + 1 >= self.max_attempts
+        self._append({"op": "dead" if dead else "failed", "id": note_id, "error": str(error)})
+        if dead:
+            LOG.error(f"Notitie '{note['titel']}' na {self.max_attempts} pogingen opgegeven "
+                      f"({error}), blijft in het journal")
+        return dead
+
+    def revive(self):
+        """Zet alle opgegeven notities terug voor een nieuwe reeks pogingen, geeft het aantal"""
+        with self._lock:
+            ids = list(self._dead)
+        for note_id in ids:
+            self._append({"op": "revive", "id": note_id})
+        return len(ids)
+
+    def done(self, note_id):
+        with self._lock:
+            if note_id not in self._pending:
+                return
+        self._append({"op": "done", "id": note_id})
+        with self._lock:
+            self._done_since_compact += 1
+            compact = self.compact_after and self._done_since_compact >= self.compact_after
+        if compact:
+            self.compact()
+
+    def track(self, session_id, utterance, begin=False):
+        """Leg een utterance van een notitie in wording vast"""
+        self._append({"op": "begin" if begin else "utt", "session": session_id, "text": utterance})
+
+    def end(self, session_id):
+        with self._lock:
+            if session_id not in self._open:
+                return
+        self._append({"op": "end", "session": session_id})
+
+    def pending(self):
+        """Notities die nog niet geüpload en niet opgegeven zijn, als notitie dicts met een id"""
+        with self._lock:
+            records = list(self._pending.values())
+        notes = []
+        for record in records:
+            note = {
+                "id": record["id"],
+                "titel": record["titel"],
+                "doel": record["doel"],
+                "inhoud": record["inhoud"],
+                "timestamp": datetime.fromisoformat(record["timestamp"]),
+                "audio": record.get("audio")
+            }
+            if "prepared" in record:
+                note["prepared"] = record["prepared"]
+            notes.append(note)
+        return notes
+
+    def open_sessions(self):
+        """Utterances per sessie van notities die bij het stoppen nog gedicteerd werden"""
+        with self._lock:
+            return {session_id: list(utterances) for session_id, utterances in self._open.items()}
+
+    def compact(self):
+        """Herschrijf het journal met alleen de openstaande notities en sessies"""
+        with self._lock:
+            if self._file.closed:
+                return
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for record in (*self._pending.values(), *self._dead.values()):
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                for session_id, utterances in self._open.items():
+                    for i, text in enumerate(utterances):
+                        record = {"op": "begin" if i == 0 else "utt", "session": session_id, "text": text}
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._unsynced = False
+            self._done_since_compact = 0
+
+    def stats(self):
+        return {"pending": len(self._pending), "open_sessions": len(self._open), "dead": len(self._dead)}
+
+    def close(self):
+        with self._lock:
+            if self._unsynced and not self._file.closed:
+                os.fsync(self._file.fileno())
+            self._file.close()
@@ -0,0 +1,163 @@
+"""Indeling van de vault in mappen per dag, maand of week.
+
+Met layout "flat" komen alle notities direct in de vault map. Met een
+gesharde indeling gaat een notitie naar een map op basis van zijn
+timestamp, zodat geen enkele map tienduizenden bestanden krijgt. Een
+bestaande platte map kan eenmalig opnieuw ingedeeld worden:
+
+    python -m ovos_skill_obsidianaddnote.layout --settings ~/.config/.../settings.json --layout day
+    python -m ovos_skill_obsidianaddnote.layout --host vault --username me --remote-path /vault --layout week --dry-run
+"""
+import argparse
+import getpass
+import json
+import os
+import posixpath
+import re
+import stat
+import sys
+from datetime import datetime
+from ovos_utils.log import LOG
+
+LAYOUTS = {
+    "flat": "",
+    "day": "%Y/%m/%d",
+    "month": "%Y/%m",
+    "week": "%G/W%V",  # ISO jaar en week, week 1 van 2027 kan nog in december 2026 vallen
+}
+
+# Namen zoals de skill ze schrijft: notities, dagnotities en bijlagen met dezelfde stam
+_NOTE_NAME_RE = re.compile(r"^(\d{8}_\d{6})_")
+_DAILY_NAME_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})\.md$")
+
+
+def layout_pattern(layout):
+    """strftime patroon voor een layout: een van LAYOUTS of een eigen patroon als "%Y/%m" """
+    layout = layout or "flat"
+    if layout in LAYOUTS:
+        return LAYOUTS[layout]
+    if "%" not in layout or ".." in layout.split("/"):
+        raise ValueError(f"onbekende layout {layout!r}, kies uit {sorted(LAYOUTS)} of een strftime patroon")
+    return layout.strip("/")
+
+
+def shard_dir(timestamp, layout):
+    """Map (relatief aan de vault) voor een notitie met deze timestamp, leeg bij "flat" """
+    pattern = layout_pattern(layout)
+    return timestamp.strftime(pattern) if pattern else ""
+
+
+def name_timestamp(name):
+    """Timestamp uit een bestandsnaam van de skill, None als de naam er geen bevat"""
+    m = _NOTE_NAME_RE.match(name)
+    if m is not None:
+        return datetime.strptime(m.group(1), "%Y%m%d_%H%M%S")
+    m = _DAILY_NAME_RE.match(name)
+    if m is not None:
+        return datetime.strptime(m.group(1), "%Y-%m-%d")
+    return None
+
+
+def migrate(connection, remote_path, layout, folder="", use_mtime=False, dry_run=False):
+    """Deel de bestanden direct in remote_path/folder opnieuw in volgens layout.
+
+    Alles gebeurt in één SFTP sessie: één listing, per shard één keer de map
+    listen en aanmaken (via de map cache van de verbinding) en per bestand
+    een rename. De timestamp komt uit de bestandsnaam; bestanden zonder
+    timestamp in de naam blijven staan, tenzij use_mtime. Een bestand dat al
+    in zijn shard staat wordt niet overschreven maar telt als mislukt.
+    Geeft tellers terug (moved, skipped, failed, shards).
+    """
+    pattern = layout_pattern(layout)
+    if not pattern:
+        raise ValueError("layout flat heeft geen shards, kies een gesharde layout")
+    source = posixpath.join(remote_path, folder) if folder else remote_path
+    result = {"moved": 0, "skipped": 0, "failed": 0, "shards": 0}
+    shards = {}  # shard map -> namen die er al in staan
+
+    def run(sftp):
+        for attr in sftp.listdir_attr(source):
+            name = attr.filename
+            if name.startswith(".") or not stat.S_ISREG(attr.st_mode):
+                continue  # .obsidian, tijdelijke bestanden en (al gesharde) mappen
+            timestamp = name_timestamp(name)
+            if timestamp is None and use_mtime:
+                timestamp = datetime.fromtimestamp(attr.st_mtime)
+            if timestamp is None:
+                result["skipped"] += 1
+                LOG.debug(f"{name} overgeslagen, geen timestamp in de naam")
+                continue
+            target_dir = posixpath.join(source, timestamp.strftime(pattern))
+            try:
+                existing = shards.get(target_dir)
+                if existing is None:
+                    # Eén listing per shard; niet elke SFTP server weigert een rename over een bestaand bestand
+                    try:
+                        existing = shards[target_dir] = set(sftp.listdir(target_dir))
+                    except IOError:
+                        existing = shards[target_dir] = set()
+                        if not dry_run:
+                            connection.ensure_dir(sftp, target_dir)
+                if name in existing:
+                    raise IOError(f"{name} bestaat al in {target_dir}")
+                if not dry_run:
+                    sftp.rename(posixpath.join(source, name), posixpath.join(target_dir, name))
+                existing.add(name)
+            except IOError as e:
+                result["failed"] += 1
+                LOG.error(f"{name} niet verplaatst naar {target_dir}: {e}")
+                continue
+            result["moved"] += 1
+
+    connection.run(run)
+    result["shards"] = len(shards)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Deel een platte Obsidian vault map eenmalig in mappen per dag, maand of week in")
+    parser.add_argument("--settings", help="settings.json van de skill, voor de ssh settings en layout")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--username")
+    parser.add_argument("--password", help="default: $OBSIDIAN_SSH_PASSWORD, anders wordt erom gevraagd")
+    parser.add_argument("--remote-path")
+    parser.add_argument("--layout", help=f"{', '.join(LAYOUTS)} of een strftime patroon")
+    parser.add_argument("--folder", default="", help="submap van de vault om in te delen, bv. de bijlagen map")
+    parser.add_argument("--use-mtime", action="store_true",
+                        help="bestanden zonder timestamp in de naam indelen op hun mtime")
+    parser.add_argument("--dry-run", action="store_true", help="alleen tellen, niets verplaatsen")
+    args = parser.parse_args(argv)
+
+    settings = {}
+    if args.settings:
+        with open(os.path.expanduser(args.settings), encoding="utf-8") as f:
+            settings = json.load(f)
+    ssh_cfg = settings.get("ssh", {})
+    host = args.host or ssh_cfg.get("host")
+    username = args.username or ssh_cfg.get("username")
+    remote_path = args.remote_path or ssh_cfg.get("remote_path")
+    layout = args.layout or settings.get("layout")
+    if not (host and username and remote_path and layout):
+        parser.error("host, username, remote-path en layout zijn nodig (via argumenten of --settings)")
+    password = (args.password or ssh_cfg.get("password") or os.environ.get("OBSIDIAN_SSH_PASSWORD")
+                or getpass.getpass(f"Wachtwoord voor {username}@{host}: "))
+
+    from .connection import SFTPConnectionManager
+    connection = SFTPConnectionManager(host, port=args.port or ssh_cfg.get("port", 22), username=username,
+                                       password=password, idle_timeout=0,
+                                       compress=ssh_cfg.get("compress", False))
+    try:
+        result = migrate(connection, remote_path, layout, folder=args.folder,
+                         use_mtime=args.use_mtime, dry_run=args.dry_run)
+    finally:
+        connection.close()
+    verb = "te verplaatsen" if args.dry_run else "verplaatst"
+    print(f"{result['moved']} bestanden {verb} naar {result['shards']} mappen, "
+          f"{result['skipped']} overgeslagen, {result['failed']} mislukt")
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Stappen van de notitie pipeline: parse, weather, render, connect, dir_probe, write
+# Tellers die ook op 0 in de export moeten staan
+COUNTERS = ("notes_finalized", "uploads_failed", "weather_failures", "bytes_written", "dedup_hits",
+            "weather_timeouts", "notes_streamed", "stream_failures", "intake_dropped",
+            "attachment_bytes", "attachments_failed", "warm_ups", "warm_ups_used", "warm_ups_late",
+            "warm_ups_failed", "warm_ups_expired", "warm_ups_wasted", "warm_ups_skipped")
+# Histogram grenzen in seconden voor de Prometheus export
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+class NoteMetrics:
+    """Tellers en latency per pipeline stap.
+
+    Per stap wordt een rollend venster van de laatste `window` metingen
+    bewaard voor percentielen, plus cumulatieve histogram buckets voor
+    de Prometheus text-file export.
+    """
+
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(int, {name: 0 for name in COUNTERS})
+        self.gauges = {}
+        self._recent = defaultdict(lambda: deque(maxlen=window))
+        self._buckets = defaultdict(lambda: [0] * (len(BUCKETS) + 1))
+        self._sum = defaultdict(float)
+        self._count = defaultdict(int)
+
+    def inc(self, counter, value=1):
+        with self._lock:
+            self.counters[counter] += value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self._recent[stage].append(seconds)
+            self._sum[stage] += seconds
+            self._count[stage] += 1
+            self._buckets[stage][bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    @contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def snapshot(self):
+        """Tellers, gauges en per stap count/gemiddelde/p50/p95/p99/max (ms) over het rollend venster"""
+        with self._lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            recent = {stage: sorted(values) for stage, values in self._recent.items()}
+            counts = dict(self._count)
+        stages = {}
+        for stage, values in recent.items():
+            stages[stage] = {
+                "count": counts[stage],
+                "avg_ms": sum(values) / len(values) * 1000 if values else 0.0,
+                "p50_ms": _percentile(values, 50) * 1000,
+                "p95_ms": _percentile(values, 95) * 1000,
+                "p99_ms": _percentile(values, 99) * 1000,
+                "max_ms": values[-1] * 1000 if values else 0.0
+            }
+        return {"counters": counters, "gauges": gauges, "stages": stages}
+
+    def prometheus_text(self, prefix="obsidian_note"):
+        """Alle tellers en histogrammen in het Prometheus text formaat"""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                lines.append(f"{prefix}_{name}_total {value}")
+            for name, value in sorted(self.gauges.items()):
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                lines.append(f"{prefix}_{name} {value}")
+            lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+            for stage in sorted(self._count):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, self._buckets[stage]):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {self._count[stage]}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {self._sum[stage]:.6f}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {self._count[stage]}')
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Schrijf de Prometheus export atomair, voor de node_exporter textfile collector"""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
@@ -0,0 +1,78 @@
+import tempfile
+
+
+class NoteBuffer:
+    """Append-only buffer voor de inhoud van een notitie.
+
+    Regels worden in een lijst verzameld en pas bij het afronden één keer
+    samengevoegd. Boven max_memory tekens gaat de inhoud naar een tijdelijk
+    bestand zodat een lang dictaat het geheugen niet vol laat lopen.
+    """
+
+    def __init__(self, max_memory=256 * 1024):
+        self.max_memory = max_memory
+        self._parts = []
+        self._file = None
+        self.size = 0
+        self.lines = 0
+
+    @property
+    def spilled(self):
+        return self._file is not None
+
+    def append_line(self, line):
+        data = line + "\n"
+        if self._file is None and self.size + len(data) > self.max_memory:
+            self._spill()
+        if self._file is not None:
+            self._file.write(data)
+        else:
+            self._parts.append(data)
+        self.size += len(data)
+        self.lines += 1
+
+    def _spill(self):
+        self._file = tempfile.TemporaryFile("w+", encoding="utf-8", prefix="obsidian-note-")
+        self._file.writelines(self._parts)
+        self._parts = []
+
+    def getvalue(self):
+        """Geef de volledige inhoud als één string"""
+        if self._file is None:
+            return "".join(self._parts)
+        self._file.flush()
+        self._file.seek(0)
+        value = self._file.read()
+        self._file.seek(0, 2)
+        return value
+
+    def write_to(self, out, chunk_size=64 * 1024):
+        """Schrijf de inhoud naar out zonder eerst één grote string te maken"""
+        if self._file is None:
+            for part in self._parts:
+                out.write(part)
+            return
+        self._file.flush()
+        self._file.seek(0)
+        while True:
+            chunk = self._file.read(chunk_size)
+            if not chunk:
+                break
+            out.write(chunk)
+        self._file.seek(0, 2)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._parts = []
+
+    def __bool__(self):
+        return self.size > 0
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        where = "bestand" if self.spilled else "geheugen"
+        return f"<NoteBuffer {self.lines} regels, {self.size} tekens in {where}>"
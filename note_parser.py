@@ -0,0 +1,73 @@
+import re
+
+PERSONA_SKILL_ID = "persona.openvoiceos"
+
+# Soorten utterances in een NOTE dictaat
+NOTE = "note"
+ENDNOTE = "endnote"
+LABEL = "label"
+TEXT = "text"
+BLOCK = "block"
+
+# NOTE of ENDNOTE als los woord, met of zonder [] eromheen
+_MARKER_RE = re.compile(r"\b(END)?NOTE\b", re.IGNORECASE)
+_LABELS = ("titel", "doel", "inhoud")
+_LABEL_BY_INITIAL = {label[0]: label for label in _LABELS}
+_LABEL_VALUE_RE = re.compile(r"(?:titel|doel|inhoud)\s*:\s*(.*)", re.IGNORECASE | re.DOTALL)
+_ENDNOTE_RE = re.compile(r"\bENDNOTE\b", re.IGNORECASE)
+# Compact formaat: "NOTE Titel: ... Doel: ... Inhoud: ... ENDNOTE" in één of enkele utterances
+_BLOCK_START_RE = re.compile(r"[\]\s:]*titel\s*:", re.IGNORECASE)
+_BLOCK_RE = re.compile(
+    r"\bNOTE\b[\]\s:]*"
+    r"titel\s*:\s*(?P<titel>.*?)\s*"
+    r"\bdoel\s*:\s*(?P<doel>.*?)\s*"
+    r"\binhoud\s*:\s*(?P<inhoud>.*?)\s*"
+    r"\[?\bENDNOTE\b",
+    re.IGNORECASE | re.DOTALL
+)
+
+
+def classify_utterance(utterance):
+    """Classificeer een (gestripte) utterance in één scan.
+
+    Geeft (soort, waarde) terug:
+    - (BLOCK, tekst vanaf NOTE) als direct na NOTE een "Titel:" label volgt
+    - (NOTE, None) bij het begin van een notitie
+    - (ENDNOTE, tekst) met de eventuele tekst rond de ENDNOTE marker
+    - (LABEL, "titel" | "doel" | "inhoud") als de utterance met een veldnaam begint
+    - (TEXT, utterance) voor al het andere
+    """
+    # Goedkope voorselectie: de meeste events zijn contentregels zonder NOTE, die hoeven niet door de regex
+    lowered = utterance.lower()
+    m = _MARKER_RE.search(utterance) if "note" in lowered else None
+    if m is not None:
+        if m.group(1) is None:
+            if _BLOCK_START_RE.match(utterance, m.end()):
+                return BLOCK, utterance[m.start():]
+            return NOTE, None
+        rest = utterance[:m.start()] + utterance[m.end():]
+        return ENDNOTE, rest.strip(" []\t\n")
+    if lowered.startswith(_LABELS):
+        # De labels verschillen in hun eerste letter
+        return LABEL, _LABEL_BY_INITIAL[lowered[0]]
+    return TEXT, utterance
+
+
+def parse_block(text):
+    """Titel, doel en contentregels uit een compleet NOTE blok in één regex pass, None als het niet past"""
+    m = _BLOCK_RE.search(text)
+    if m is None:
+        return None
+    lines = [line.rstrip() for line in m.group("inhoud").split("\n")]
+    return m.group("titel").strip(), m.group("doel").strip(), lines
+
+
+def block_ended(text):
+    """True als een (deel van een) NOTE blok de ENDNOTE marker bevat"""
+    return _ENDNOTE_RE.search(text) is not None
+
+
+def label_value(utterance):
+    """De waarde achter "Titel:" / "Doel:" / "Inhoud:" op dezelfde regel, of leeg"""
+    m = _LABEL_VALUE_RE.match(utterance)
+    return m.group(1).strip() if m else ""
@@ -0,0 +1,393 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from ovos_utils.log import LOG
+from .metrics import NoteMetrics
+from .storage import NoteStorage, NoteStreamHandle
+
+
+class ReplicatedStorage(NoteStorage):
+    """Schrijft elke notitie tegelijk naar meerdere opslag targets.
+
+    Een notitie telt als opgeslagen zodra quorum targets hem hebben; de
+    upload wacht niet op de rest. Targets die dan nog bezig zijn maken het
+    op de achtergrond af, en een target waar het mislukte probeert het daar
+    opnieuw (max_retries keer, met verdubbelende backoff). Haalt een
+    notitie het quorum niet, dan geeft write_notes de fout terug en slaat
+    een volgende poging de targets over die hem al hebben. Lezen (voor de
+    vault index) gaat via het eerste target. Per target wordt de latency
+    als stap "target_<naam>" bijgehouden.
+    """
+    name = "replicated"
+
+    def __init__(self, targets, quorum=1, max_retries=3, backoff=2.0, metrics=None):
+        self.targets = list(targets)  # [(naam, NoteStorage)]
+        self.quorum = max(1, min(int(quorum), len(self.targets)))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.metrics = metrics or NoteMetrics()
+        # Per target één thread voor de eerste poging en één voor retries, zodat een
+        # onbereikbaar target nooit de andere targets ophoudt
+        self._writers = {name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"ObsidianReplica-{name}")
+                         for name, _ in self.targets}
+        self._retriers = {name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"ObsidianRetry-{name}")
+                          for name, _ in self.targets}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._stats = {name: {"writes": 0, "failures": 0, "retries": 0, "lagging": 0, "lost": 0}
+                       for name, _ in self.targets}
+
+    @property
+    def primary(self):
+        return self.targets[0][1]
+
+    def _submit(self, executors, name, func, *args):
+        """Zet werk klaar voor een target, None na close()"""
+        try:
+            return executors[name].submit(func, *args)
+        except RuntimeError:
+            return None
+
+    def _count(self, name, key, value=1):
+        with self._lock:
+            self._stats[name][key] += value
+
+    def _timed_write(self, name, storage, notes):
+        # Een eerdere poging die nog liep kan dit target intussen gehaald hebben
+        with self._lock:
+            notes = [note if note is not None and name not in note["replicas"] else None for note in notes]
+        if not any(notes):
+            return [None] * len(notes)
+        start = time.perf_counter()
+        try:
+            results = storage.write_notes(notes)
+        except Exception as e:
+            results = [e if note is not None else None for note in notes]
+        self.metrics.observe(f"target_{name}", time.perf_counter() - start)
+        with self._lock:
+            for note, error in zip(notes, results):
+                if note is None:
+                    continue
+                if error is None:
+                    note["replicas"].add(name)
+                    self._stats[name]["writes"] += 1
+                else:
+                    self._stats[name]["failures"] += 1
+        return results
+
+    def _replicate(self, name, storage, notes, first, decided):
+        """Eerste poging op één target; mislukte notities gaan naar de retry thread van het target"""
+        results = self._timed_write(name, storage, notes)
+        first.set_result(results)
+        failed = [note for note, error in zip(notes, results) if note is not None and error is not None]
+        if failed:
+            self._submit(self._retriers, name, self._retry, name, storage, failed, decided)
+
+    def _retry(self, name, storage, failed, decided):
+        decided.wait()
+        # Notities zonder quorum krijgen een nieuwe poging van de upload wachtrij, op alle targets
+        failed = [note for note in failed if note.get("committed")]
+        if not failed:
+            return
+        for attempt in range(self.max_retries):
+            if self._closed.wait(self.backoff * 2 ** attempt):
+                return
+            self._count(name, "retries", len(failed))
+            results = self._timed_write(name, storage, failed)
+            failed = [note for note, error in zip(failed, results) if error is not None]
+            if not failed:
+                LOG.info(f"Target {name} heeft de achterstand ingehaald")
+                return
+        self._count(name, "lost", len(failed))
+        LOG.error(f"Target {name}: {len(failed)} notitie(s) na {self.max_retries} pogingen "
+                  f"niet gerepliceerd: {', '.join(note['path'] for note in failed)}")
+
+    def write_notes(self, notes):
+        for note in notes:
+            if note is not None:
+                note.setdefault("replicas", set())
+        decided = threading.Event()
+        running = {}
+        for name, storage in self.targets:
+            # Een eerdere poging die dit target al haalde niet herhalen (append modus!)
+            todo = [note if note is not None and name not in note["replicas"] else None for note in notes]
+            if not any(todo):
+                continue
+            first = Future()
+            self._writers[name].submit(self._replicate, name, storage, todo, first, decided)
+            running[first] = (name, todo)
+
+        results = [None] * len(notes)
+        undecided = {i for i, note in enumerate(notes) if note is not None}
+        remaining = dict(running)
+        while True:
+            for i in list(undecided):
+                note = notes[i]
+                have = len(note["replicas"])
+                could = have + sum(1 for _, todo in remaining.values() if todo[i] is not None)
+                if have >= self.quorum:
+                    note["committed"] = True
+                    results[i] = None
+                    undecided.discard(i)
+                elif could < self.quorum:
+                    undecided.discard(i)
+            if not undecided or not remaining:
+                break
+            done, _ = wait(remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, todo = remaining.pop(future)
+                for i, error in enumerate(future.result()):
+                    if error is not None and results[i] is None:
+                        results[i] = error
+        for i, note in enumerate(notes):
+            if note is None or note.get("committed"):
+                results[i] = None
+            elif results[i] is None:
+                results[i] = RuntimeError(f"quorum {self.quorum} niet gehaald")
+        for future, (name, _) in remaining.items():
+            self._count(name, "lagging")
+            LOG.debug(f"Target {name} loopt achter, schrijft op de achtergrond verder")
+        decided.set()
+        return results
+
+    def warm_up(self):
+        futures = [self._writers[name].submit(storage.warm_up) for name, storage in self.targets]
+        ok = 0
+        for (name, _), future in zip(self.targets, futures):
+            try:
+                future.result()
+                ok += 1
+            except Exception as e:
+                LOG.debug(f"Target {name} niet klaargezet: {e}")
+        if ok < self.quorum:
+            raise RuntimeError(f"{ok} van {len(self.targets)} targets klaargezet, quorum {self.quorum}")
+
+    def is_warm(self):
+        return sum(1 for _, storage in self.targets if storage.is_warm()) >= self.quorum
+
+    def open_stream(self, path, atomic=True):
+        return _ReplicatedStreamHandle(self, path, atomic)
+
+    def upload_file(self, local_path, path, chunk_size=32768, window=64, on_done=None):
+        """Als write_notes, voor een bijlage.
+
+        Targets die na het quorum nog bezig zijn lezen local_path nog; on_done()
+        komt pas als elk target klaar is of het definitief opgegeven heeft. Na
+        close() met een retry nog open komt on_done niet, het bestand blijft staan.
+        """
+        decided = threading.Event()
+        # Eén referentie per target plus één voor deze aanroep, tot het quorum beslist is
+        state = {"committed": False, "open": len(self.targets) + 1, "on_done": on_done}
+        futures = {}
+        for name, storage in self.targets:
+            first = Future()
+            self._writers[name].submit(self._replicate_file, name, storage, (local_path, path, chunk_size, window),
+                                       first, decided, state)
+            futures[first] = name
+        ok, errors, size = 0, [], 0
+        pending = set(futures)
+        while pending and ok < self.quorum and ok + len(pending) >= self.quorum:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    size = future.result()
+                    ok += 1
+                except Exception as e:
+                    errors.append(e)
+        state["committed"] = ok >= self.quorum
+        decided.set()
+        self._file_settled(state)
+        if not state["committed"]:
+            raise errors[0] if errors else RuntimeError(f"quorum {self.quorum} niet gehaald")
+        for future in pending:
+            self._count(futures[future], "lagging")
+        return size
+
+    def _file_settled(self, state):
+        """Eén target (of upload_file zelf) leest het lokale bestand niet meer"""
+        with self._lock:
+            state["open"] -= 1
+            last = state["open"] == 0
+        if last and state["committed"] and state["on_done"] is not None:
+            state["on_done"]()
+
+    def _replicate_file(self, name, storage, args, first, decided, state):
+        """Als _replicate, voor een bijlage"""
+        try:
+            first.set_result(self._upload_once(name, storage, *args))
+        except Exception as e:
+            first.set_exception(e)
+            if self._submit(self._retriers, name, self._retry_file, name, storage, args, decided, state) is None:
+                return  # gesloten: het bestand blijft staan
+        else:
+            self._file_settled(state)
+
+    def _upload_once(self, name, storage, local_path, path, chunk_size, window):
+        start = time.perf_counter()
+        try:
+            size = storage.upload_file(local_path, path, chunk_size=chunk_size, window=window)
+        except Exception as e:
+            self._count(name, "failures")
+            LOG.warning(f"Target {name}: bijlage {path} niet geüpload: {e}")
+            raise
+        finally:
+            self.metrics.observe(f"target_{name}", time.perf_counter() - start)
+        self._count(name, "writes")
+        return size
+
+    def _retry_file(self, name, storage, args, decided, state):
+        decided.wait()
+        if not state["committed"]:
+            self._file_settled(state)
+            return
+        for attempt in range(self.max_retries):
+            if self._closed.wait(self.backoff * 2 ** attempt):
+                return  # gesloten: het bestand blijft staan
+            self._count(name, "retries")
+            try:
+                self._upload_once(name, storage, *args)
+            except Exception:
+                continue
+            self._file_settled(state)
+            return
+        self._count(name, "lost")
+        LOG.error(f"Target {name}: bijlage {args[1]} na {self.max_retries} pogingen niet gerepliceerd")
+        self._file_settled(state)
+
+    def stat_mtime(self, path):
+        return self.primary.stat_mtime(path)
+
+    def list_dir(self, path):
+        return self.primary.list_dir(path)
+
+    def read_head(self, path, size):
+        return self.primary.read_head(path, size)
+
+    def stats(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def close(self):
+        # Lopende en klaargezette writes nog afmaken, retries niet meer
+        self._closed.set()
+        for executor in self._retriers.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        for executor in self._writers.values():
+            executor.shutdown(wait=True)
+        for _, storage in self.targets:
+            storage.close()
+
+
+class _ReplicatedStreamHandle(NoteStreamHandle):
+    """Een gestreamde notitie naar alle targets.
+
+    Openen, schrijven en afronden gaan per target in volgorde via de writer
+    thread van dat target, zodat een traag target de andere niet ophoudt.
+    Een target dat afhaakt krijgt de notitie na de commit als geheel.
+    """
+
+    def __init__(self, storage, path, atomic):
+        self.storage = storage
+        self.path = path
+        self.failed = set()
+        self._handles = {}
+        self._parts = []
+        opened = {storage._writers[name].submit(self._open, name, target, atomic): name
+                  for name, target in storage.targets}
+        if self._quorum(opened) < storage.quorum:
+            self.abort()
+            raise RuntimeError(f"stream {path}: minder dan {storage.quorum} target(s) bereikbaar")
+
+    def _quorum(self, futures, on_late=None):
+        """Wacht tot quorum futures gelukt zijn of dat niet meer kan, geeft het aantal gelukte"""
+        ok, pending = 0, set(futures)
+        while pending and ok < self.storage.quorum and ok + len(pending) >= self.storage.quorum:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            ok += sum(1 for future in done if future.exception() is None)
+        for future in pending:
+            self.storage._count(futures[future], "lagging")
+            if on_late is not None:
+                future.add_done_callback(on_late(futures[future]))
+        return ok
+
+    def _fail(self, name, action, error):
+        LOG.warning(f"Target {name}: stream {self.path} {action} mislukt: {error}")
+        self.failed.add(name)
+        handle = self._handles.pop(name, None)
+        if handle is not None:
+            try:
+                handle.abort()
+            except Exception:
+                pass
+
+    def _open(self, name, target, atomic):
+        try:
+            self._handles[name] = target.open_stream(self.path, atomic=atomic)
+        except Exception as e:
+            self._fail(name, "openen", e)
+            raise
+
+    def _write(self, name, text):
+        handle = self._handles.get(name)
+        if handle is None:
+            return
+        try:
+            handle.write(text)
+        except Exception as e:
+            self._fail(name, "schrijven", e)
+
+    def write(self, text):
+        self._parts.append(text)
+        for name, _ in self.storage.targets:
+            if name not in self.failed:
+                self.storage._submit(self.storage._writers, name, self._write, name, text)
+        if len(self.storage.targets) - len(self.failed) < self.storage.quorum:
+            raise RuntimeError(f"stream {self.path}: minder dan {self.storage.quorum} target(s) over")
+
+    def _commit(self, name):
+        handle = self._handles.pop(name, None)
+        if handle is None:
+            raise RuntimeError("stream niet open")
+        try:
+            handle.commit()
+        except Exception as e:
+            self._fail(name, "afronden", e)
+            raise
+        self.storage._count(name, "writes")
+
+    def commit(self):
+        committed = {self.storage._writers[name].submit(self._commit, name): name
+                     for name, _ in self.storage.targets}
+        if self._quorum(committed, on_late=self._late_commit) < self.storage.quorum:
+            raise RuntimeError(f"stream {self.path}: quorum {self.storage.quorum} niet gehaald")
+        for future, name in committed.items():
+            if future.done() and future.exception() is not None:
+                self._write_whole(name)
+
+    def _late_commit(self, name):
+        def done(future):
+            if not future.cancelled() and future.exception() is not None:
+                self._write_whole(name)
+        return done
+
+    def _write_whole(self, name):
+        """Schrijf de notitie als geheel naar een target dat tijdens het streamen afhaakte, met retries"""
+        storage = dict(self.storage.targets)[name]
+        note = {"path": self.path, "markdown": "".join(self._parts), "title": None,
+                "replicas": set(), "committed": True}
+        decided = threading.Event()
+        decided.set()
+        self.storage._submit(self.storage._writers, name, self.storage._replicate, name, storage, [note],
+                             Future(), decided)
+
+    def _abort(self, name):
+        handle = self._handles.pop(name, None)
+        if handle is not None:
+            try:
+                handle.abort()
+            except Exception:
+                pass
+
+    def abort(self):
+        for name, _ in self.storage.targets:
+            self.storage._submit(self.storage._writers, name, self._abort, name)
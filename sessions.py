@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class NoteSession:
+    """Note state van één bus sessie, bv. één HiveMind satelliet"""
+    __slots__ = ("session_id", "collecting", "note", "await_field", "last_seen", "truncated",
+                 "stream", "audio", "block", "warm")
+
+    def __init__(self, session_id, note):
+        self.session_id = session_id
+        self.collecting = False
+        self.note = note
+        self.await_field = None
+        self.last_seen = time.monotonic()
+        self.truncated = False
+        # NoteStream als de notitie tijdens het dicteren geschreven wordt, False als dat niet kan
+        self.stream = None
+        # Lokaal audiobestand van het dictaat, voor de volgende afgeronde notitie
+        self.audio = None
+        # Utterances van een NOTE blok in het compacte formaat, tot ENDNOTE
+        self.block = None
+        # (start, future) van het vooraf verbinden met de opslag sinds NOTE, tot ENDNOTE
+        self.warm = None
+
+    def __repr__(self):
+        return (f"<NoteSession {self.session_id} collecting={self.collecting} "
+                f"await={self.await_field} note={self.note}>")
+
+
+class NoteSessionRegistry:
+    """Note sessies per session id, met idle timeout en een maximum aantal.
+
+    Sessies staan op volgorde van laatste activiteit, zodat idle sessies en
+    bij een volle registry de oudste sessie goedkoop vooraan te vinden zijn.
+    on_evict(session, reden) wordt aangeroepen voor elke verwijderde sessie.
+    """
+
+    def __init__(self, new_note, idle_timeout=600, max_sessions=32, on_evict=None):
+        self.new_note = new_note
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max(1, int(max_sessions))
+        self.on_evict = on_evict
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._newest = None
+        self._next_idle_check = 0.0
+        self.evicted = 0
+
+    def get(self, session_id):
+        """Geef (of maak) de sessie en markeer hem als actief"""
+        now = time.monotonic()
+        # Snelle weg zonder lock: dezelfde sessie als het vorige event en nog geen idle controle nodig
+        session = self._newest
+        if session is not None and session.session_id == session_id and now < self._next_idle_check:
+            session.last_seen = now
+            return session
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                if self._newest is not session:
+                    self._sessions.move_to_end(session_id)
+                    self._newest = session
+                session.last_seen = now
+                # Idle sessies hoeven niet bij elk event gezocht te worden
+                if now < self._next_idle_check:
+                    return session
+            else:
+                session = NoteSession(session_id, self.new_note())
+                self._sessions[session_id] = session
+                self._newest = session
+            evicted = self._evict(now, session)
+        for old, reason in evicted:
+            if self.on_evict:
+                self.on_evict(old, reason)
+        return session
+
+    def _evict(self, now, current):
+        evicted = []
+        if not self.idle_timeout:
+            self._next_idle_check = float("inf")
+        else:
+            self._next_idle_check = now + self.idle_timeout / 10
+            # Idle sessies staan vooraan
+            while True:
+                oldest = next(iter(self._sessions.values()))
+                if oldest is current or now - oldest.last_seen < self.idle_timeout:
+                    break
+                evicted.append((self._sessions.popitem(last=False)[1], "idle"))
+        while len(self._sessions) > self.max_sessions:
+            evicted.append((self._sessions.popitem(last=False)[1], "max_sessions"))
+        self.evicted += len(evicted)
+        return evicted
+
+    def remove(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is self._newest:
+                self._newest = None
+            return session
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def __len__(self):
+        return len(self._sessions)
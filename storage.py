@@ -0,0 +1,410 @@
+import os
+import posixpath
+import stat
+import tempfile
+import threading
+import time
+from ovos_utils.log import LOG
+from .metrics import NoteMetrics
+
+STREAM_BUFSIZE = 32 * 1024
+
+
+class NoteStorage:
+    """Opslag voor notities.
+
+    write_notes krijgt voorbereide notities (dicts met "path" relatief aan de
+    vault map, "markdown" en optioneel "mode" en "header") en geeft per
+    notitie None (opgeslagen of overgeslagen) of de exception terug.
+    """
+    name = "storage"
+
+    def write_notes(self, notes):
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Maak de opslag klaar voor de volgende notitie (verbinding, map), mag niets doen"""
+
+    def is_warm(self):
+        """True als wat warm_up klaargezet heeft nog bruikbaar is (bv. de verbinding nog open)"""
+        return True
+
+    def open_stream(self, path, atomic=True):
+        """Open een notitie om stukje voor stukje te schrijven, zie NoteStreamHandle"""
+        raise NotImplementedError(f"{self.name} opslag ondersteunt geen streaming")
+
+    def upload_file(self, local_path, path, chunk_size=32768, window=64, on_done=None):
+        """Kopieer een (groot) binair bestand in blokken naar path, geeft het aantal bytes.
+
+        Na een gelukte upload wordt on_done() aangeroepen zodra local_path niet
+        meer gelezen wordt; dat kan ook na het returnen zijn (zie ReplicatedStorage).
+        """
+        raise NotImplementedError(f"{self.name} opslag ondersteunt geen bijlagen")
+
+    # Lezen van de vault, voor de vault index; paden zijn relatief aan de vault map
+    def stat_mtime(self, path):
+        raise NotImplementedError
+
+    def list_dir(self, path):
+        """(naam, is_map, mtime, grootte) per entry in path"""
+        raise NotImplementedError
+
+    def read_head(self, path, size):
+        """De eerste size bytes van een notitie als tekst"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class NoteStreamHandle:
+    """Een notitie die tijdens het dicteren geschreven wordt.
+
+    write() voegt tekst toe, commit() sluit het bestand en maakt het (bij
+    atomic via een rename) zichtbaar, abort() ruimt een half bestand op.
+    """
+
+    def write(self, text):
+        raise NotImplementedError
+
+    def commit(self):
+        raise NotImplementedError
+
+    def abort(self):
+        raise NotImplementedError
+
+
+class SFTPStorage(NoteStorage):
+    """Notities via de gedeelde Paramiko SFTP verbinding naar de Obsidian server"""
+    name = "sftp"
+
+    def __init__(self, connection, remote_path):
+        self.connection = connection
+        self.remote_path = remote_path
+
+    def warm_up(self):
+        # Verbinden en de vault map controleren, bij een open verbinding is dit een cache hit
+        self.connection.run(lambda sftp: self.connection.ensure_dir(sftp, self.remote_path))
+
+    def is_warm(self):
+        # De idle timer kan de verbinding sinds de warm-up gesloten hebben
+        return self.connection.is_alive()
+
+    def write_notes(self, notes):
+        results = [None] * len(notes)
+        connection = self.connection
+        written = set()
+
+        def upload(sftp):
+            for i, note in enumerate(notes):
+                if note is None or i in written:
+                    continue
+                remote_file = posixpath.join(self.remote_path, note["path"])
+                try:
+                    connection.write_file(sftp, remote_file, note["markdown"],
+                                          mode=note.get("mode", "w"), header=note.get("header"))
+                except Exception as e:
+                    if not connection.is_alive():
+                        raise  # run() verbindt opnieuw en slaat de al geschreven notities over
+                    LOG.error(f"SFTP upload mislukt: {remote_file}: {e}")
+                    results[i] = e
+                    continue
+                written.add(i)
+                results[i] = None
+                LOG.info(f"Notitie opgeslagen via SFTP : {remote_file}")
+
+        try:
+            connection.run(upload)
+            LOG.debug(f"Remote map cache: {connection.dir_cache_stats()}")
+        except Exception as e:
+            LOG.error(f"SFTP upload mislukt: {e}")
+            for i, note in enumerate(notes):
+                if note is not None and i not in written:
+                    results[i] = e
+        return results
+
+    def open_stream(self, path, atomic=True):
+        return _SFTPStreamHandle(self.connection, posixpath.join(self.remote_path, path), atomic)
+
+    def upload_file(self, local_path, path, chunk_size=32768, window=64, on_done=None):
+        remote_file = posixpath.join(self.remote_path, path)
+        size = self.connection.run(
+            lambda sftp: self.connection.upload_file(sftp, local_path, remote_file, chunk_size, window))
+        LOG.info(f"Bijlage opgeslagen via SFTP : {remote_file}")
+        if on_done is not None:
+            on_done()
+        return size
+
+    def stat_mtime(self, path):
+        remote = posixpath.join(self.remote_path, path)
+        return self.connection.run(lambda sftp: sftp.stat(remote).st_mtime)
+
+    def list_dir(self, path):
+        remote = posixpath.join(self.remote_path, path)
+        entries = self.connection.run(lambda sftp: sftp.listdir_attr(remote))
+        return [(attr.filename, stat.S_ISDIR(attr.st_mode), attr.st_mtime, attr.st_size)
+                for attr in entries]
+
+    def read_head(self, path, size):
+        remote = posixpath.join(self.remote_path, path)
+
+        def read(sftp):
+            with sftp.open(remote, "r") as f:
+                return f.read(size)
+        return self.connection.run(read).decode("utf-8", errors="replace")
+
+    def close(self):
+        self.connection.close()
+
+
+class _SFTPStreamHandle(NoteStreamHandle):
+    def __init__(self, connection, remote_file, atomic):
+        self.connection = connection
+        self.remote_file = remote_file
+        self.tmp_file = remote_file
+        if atomic:
+            directory, name = posixpath.split(remote_file)
+            self.tmp_file = posixpath.join(directory, f".{name}.tmp")
+        # Zonder tijdelijk bestand nooit een bestaande notitie overschrijven (en bij abort() weggooien)
+        mode = "w" if atomic else "wx"
+        # Via run(), zodat de idle timer de verbinding niet halverwege het dicteren sluit
+        # Regels in blokken van STREAM_BUFSIZE versturen in plaats van één SFTP request per regel
+        self._file = connection.run(lambda sftp: connection.open_file(sftp, self.tmp_file, mode, STREAM_BUFSIZE))
+
+    def write(self, text):
+        self.connection.run(lambda sftp: self._file.write(text))
+
+    def commit(self):
+        def finish(sftp):
+            start = time.perf_counter()
+            self._file.close()
+            if self.tmp_file != self.remote_file:
+                sftp.posix_rename(self.tmp_file, self.remote_file)
+            self.connection.metrics.observe("write", time.perf_counter() - start)
+        self.connection.run(finish)
+        LOG.info(f"Notitie gestreamd via SFTP : {self.remote_file}")
+
+    def abort(self):
+        def remove(sftp):
+            try:
+                self._file.close()
+            except Exception:
+                pass
+            sftp.remove(self.tmp_file)
+        try:
+            self.connection.run(remove)
+        except Exception as e:
+            LOG.warning(f"Half gestreamde notitie {self.tmp_file} niet verwijderd: {e}")
+
+
+class LocalStorage(NoteStorage):
+    """Notities direct in een lokale vault map, zonder SSH"""
+    name = "local"
+
+    def __init__(self, path, metrics=None):
+        self.path = path
+        self.known_dirs = set()
+        self.metrics = metrics or NoteMetrics()
+
+    def warm_up(self):
+        if self.path not in self.known_dirs:
+            os.makedirs(self.path, exist_ok=True)
+            self.known_dirs.add(self.path)
+
+    def open_stream(self, path, atomic=True):
+        target = os.path.join(self.path, path)
+        directory = os.path.dirname(target)
+        if directory not in self.known_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self.known_dirs.add(directory)
+        return _LocalStreamHandle(target, atomic, self.metrics)
+
+    def upload_file(self, local_path, path, chunk_size=32768, window=64, on_done=None):
+        target = os.path.join(self.path, path)
+        directory = os.path.dirname(target)
+        if directory not in self.known_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self.known_dirs.add(directory)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".obsidian-", suffix=".part")
+        size = 0
+        try:
+            with open(local_path, "rb") as src, os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    size += len(chunk)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        LOG.info(f"Bijlage lokaal opgeslagen: {target}")
+        if on_done is not None:
+            on_done()
+        return size
+
+    def stat_mtime(self, path):
+        return os.stat(os.path.join(self.path, path)).st_mtime
+
+    def list_dir(self, path):
+        entries = []
+        with os.scandir(os.path.join(self.path, path)) as it:
+            for entry in it:
+                info = entry.stat()
+                entries.append((entry.name, entry.is_dir(), info.st_mtime, info.st_size))
+        return entries
+
+    def read_head(self, path, size):
+        with open(os.path.join(self.path, path), encoding="utf-8", errors="replace") as f:
+            return f.read(size)
+
+    def _write(self, note):
+        target = os.path.join(self.path, note["path"])
+        directory = os.path.dirname(target)
+        if directory not in self.known_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self.known_dirs.add(directory)
+        if note.get("mode", "w") == "a":
+            with open(target, "a", encoding="utf-8") as f:
+                if note.get("header") and f.tell() == 0:
+                    f.write(note["header"])
+                f.write(note["markdown"])
+            return target
+        # Eerst naar een tijdelijk bestand, Obsidian ziet de notitie pas na de rename
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".obsidian-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(note["markdown"])
+            os.chmod(tmp, 0o644)  # mkstemp maakt het bestand alleen leesbaar voor ons
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return target
+
+    def write_notes(self, notes):
+        results = [None] * len(notes)
+        for i, note in enumerate(notes):
+            if note is None:
+                continue
+            try:
+                with self.metrics.timed("write"):
+                    target = self._write(note)
+            except Exception as e:
+                LOG.error(f"Lokaal opslaan mislukt: {note['path']}: {e}")
+                results[i] = e
+                continue
+            LOG.info(f"Notitie lokaal opgeslagen: {target}")
+        return results
+
+
+class _LocalStreamHandle(NoteStreamHandle):
+    def __init__(self, target, atomic, metrics):
+        self.target = target
+        self.metrics = metrics
+        if atomic:
+            fd, self.tmp = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".obsidian-", suffix=".tmp")
+            self._file = os.fdopen(fd, "w", encoding="utf-8")
+        else:
+            self.tmp = target
+            # Nooit een bestaande notitie overschrijven (en bij abort() weggooien)
+            self._file = open(target, "x", encoding="utf-8")
+
+    def write(self, text):
+        self._file.write(text)
+        self._file.flush()
+
+    def commit(self):
+        with self.metrics.timed("write"):
+            self._file.close()
+            if self.tmp != self.target:
+                os.chmod(self.tmp, 0o644)
+                os.replace(self.tmp, self.target)
+        LOG.info(f"Notitie lokaal gestreamd: {self.target}")
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.unlink(self.tmp)
+        except OSError:
+            pass
+
+
+class MemoryStorage(NoteStorage):
+    """Notities in het geheugen, voor benchmarks en tests"""
+    name = "memory"
+
+    def __init__(self):
+        self.files = {}
+        self._lock = threading.Lock()
+
+    def write_notes(self, notes):
+        with self._lock:
+            for note in notes:
+                if note is None:
+                    continue
+                if note.get("mode", "w") == "a":
+                    current = self.files.get(note["path"], "")
+                    if not current and note.get("header"):
+                        current = note["header"]
+                    self.files[note["path"]] = current + note["markdown"]
+                else:
+                    self.files[note["path"]] = note["markdown"]
+        return [None] * len(notes)
+
+    def open_stream(self, path, atomic=True):
+        return _MemoryStreamHandle(self, path)
+
+    def upload_file(self, local_path, path, chunk_size=32768, window=64, on_done=None):
+        chunks = []
+        with open(local_path, "rb") as src:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        data = b"".join(chunks)
+        with self._lock:
+            self.files[path] = data
+        if on_done is not None:
+            on_done()
+        return len(data)
+
+    def stat_mtime(self, path):
+        return None  # geen mtimes: elke refresh list alle mappen opnieuw
+
+    def list_dir(self, path):
+        prefix = path + "/" if path else ""
+        with self._lock:
+            names = [name[len(prefix):] for name in self.files if name.startswith(prefix)]
+            entries = {}
+            for name in names:
+                first, _, rest = name.partition("/")
+                if rest:
+                    entries[first] = (first, True, None, 0)
+                else:
+                    entries[first] = (first, False, None, len(self.files[prefix + first]))
+        return list(entries.values())
+
+    def read_head(self, path, size):
+        with self._lock:
+            return self.files[path][:size]
+
+
+class _MemoryStreamHandle(NoteStreamHandle):
+    def __init__(self, storage, path):
+        self.storage = storage
+        self.path = path
+        self._parts = []
+
+    def write(self, text):
+        self._parts.append(text)
+
+    def commit(self):
+        with self.storage._lock:
+            self.storage.files[self.path] = "".join(self._parts)
+
+    def abort(self):
+        self._parts = []
@@ -0,0 +1,93 @@
+import threading
+from ovos_utils.log import LOG
+
+
+class NoteStream:
+    """Schrijft een notitie naar de opslag terwijl hij nog gedicteerd wordt.
+
+    Alle stappen lopen op de gedeelde stream thread, in volgorde, zodat de
+    bus handler nooit op het netwerk wacht. opener() geeft (handle, kop,
+    staart) terug: de kop wordt meteen geschreven, daarna de contentregels,
+    samengevoegd als ze sneller binnenkomen dan ze geschreven worden, en
+    finish() schrijft de staart en maakt de notitie zichtbaar. Na de eerste
+    fout doet de stream niets meer en staat de fout in error; de notitie
+    wordt dan gewoon als geheel geüpload.
+    """
+
+    def __init__(self, executor, opener, path, timestamp):
+        self.path = path
+        self.timestamp = timestamp
+        # Audiobestand waarvan de embed al in de staart gerenderd is
+        self.audio = None
+        self.error = None
+        self.bytes = 0
+        self._executor = executor
+        self._handle = None
+        self._tail = ""
+        self._pending = []
+        self._lock = threading.Lock()
+        self._submit(self._open, opener)
+
+    def _submit(self, func, *args):
+        return self._executor.submit(self._guarded, func, *args)
+
+    def _guarded(self, func, *args):
+        if self.error is not None:
+            return
+        try:
+            func(*args)
+        except Exception as e:
+            LOG.warning(f"Streamen van {self.path} mislukt, notitie wordt bij ENDNOTE geüpload: {e}")
+            self.error = e
+            self._abort()
+
+    def _open(self, opener):
+        self._handle, head, self._tail = opener()
+        self._write(head)
+
+    def _write(self, text):
+        self._handle.write(text)
+        self.bytes += len(text.encode("utf-8"))
+
+    def append(self, text):
+        with self._lock:
+            self._pending.append(text)
+            if len(self._pending) > 1:
+                return  # er staat al een flush klaar die deze regel meeneemt
+        self._submit(self._flush)
+
+    def _flush(self):
+        with self._lock:
+            text = "".join(self._pending)
+            self._pending = []
+        if text:
+            self._write(text)
+
+    def _commit(self):
+        self._flush()
+        self._write(self._tail)
+        self._handle.commit()
+        self._handle = None
+
+    def finish(self, timeout=30):
+        """Schrijf de staart en sluit af; geeft None of de fout terug"""
+        try:
+            self._submit(self._commit).result(timeout)
+        except Exception as e:
+            # Te laat: niet alsnog committen naast de gewone upload
+            self.error = self.error or e
+            self.abort()
+        return self.error
+
+    def _abort(self):
+        if self._handle is not None:
+            self._handle.abort()
+            self._handle = None
+
+    def abort(self):
+        """Gooi de half geschreven notitie weg, bv. als de sessie verlaten wordt"""
+        def abort():
+            self._abort()
+            self.error = self.error or RuntimeError("stream afgebroken")
+        self._executor.submit(abort)
+
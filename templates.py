@@ -0,0 +1,168 @@
+import os
+import string
+from datetime import date
+from functools import lru_cache
+from ovos_utils.log import LOG
+
+# Standaard templates, gelijk aan de oorspronkelijke Dagverslag notitie
+DEFAULT_TEMPLATES = {
+    "note": """# {title}
+
+*Categorie:* Dagverslag  
+Dag: {dagnaam}  
+Week: W{weeknummer}  
+Maand: {maandnaam}  
+Kwartaal: Q{kwartaal}  
+Jaar: {jaar}  
+
+## Deze dag:
+Weer: {weather}  
+Oorsprong: {origin}
+
+## Inhoud
+{content}
+{attachments}{related}""",
+    "daily_header": """# {datum}
+
+*Categorie:* Dagverslag  
+Dag: {dagnaam}  
+Week: W{weeknummer}  
+Maand: {maandnaam}  
+Kwartaal: Q{kwartaal}  
+Jaar: {jaar}  
+""",
+    "daily_section": """
+## {tijd} {title}
+Weer: {weather}  
+Oorsprong: {origin}
+
+{content}
+{attachments}{related}"""
+}
+
+# Velden die in een template gebruikt mogen worden
+FIELDS = {"title", "goal", "content", "weather", "origin", "tijd", "related", "attachments",
+          "datum", "dagnaam", "weeknummer", "maandnaam", "kwartaal", "jaar"}
+
+
+@lru_cache(maxsize=8)
+def date_fields(day: date):
+    """Datum velden voor de notitie metadata, één keer berekend per kalenderdag"""
+    return {
+        "datum": day.strftime("%Y-%m-%d"),
+        "dagnaam": day.strftime("%A"),
+        "weeknummer": day.isocalendar()[1],
+        "maandnaam": day.strftime("%B"),
+        "kwartaal": (day.month - 1) // 3 + 1,
+        "jaar": day.year
+    }
+
+
+def _sample_values():
+    """Voorbeeldwaarden met dezelfde types als bij een echte notitie"""
+    values = dict.fromkeys(FIELDS, "voorbeeld")
+    values.update(date_fields(date(2024, 1, 1)))
+    return values
+
+
+class _Chunks(list):
+    """Output buffer die alleen referenties verzamelt, pas join() kopieert"""
+    write = list.append
+
+
+def _render_parts(parts, out, values):
+    for literal, field, spec, conversion in parts:
+        if literal:
+            out.write(literal)
+        if field is None:
+            continue
+        value = values[field]
+        if hasattr(value, "write_to") and not spec and not conversion:
+            value.write_to(out)
+            continue
+        if conversion == "r":
+            value = repr(value)
+        elif conversion == "s":
+            value = str(value)
+        out.write(format(value, spec))
+
+
+class NoteTemplate:
+    """Een template die één keer in letterlijke tekst en velden geparsed wordt.
+
+    Een onbekend veld, conversie of opmaak (bv. {title:d}) geeft al bij het
+    compileren een ValueError, via een proefrender met voorbeeldwaarden.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(source):
+            if field is not None and field not in FIELDS:
+                raise ValueError(f"onbekend veld {{{field}}} in template")
+            if conversion not in (None, "r", "s"):
+                raise ValueError(f"onbekende conversie !{conversion} in template")
+            self.parts.append((literal, field, spec or "", conversion))
+        try:
+            self.render(_sample_values())
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"template niet te renderen: {e}") from e
+
+    def render_to(self, out, values):
+        """Schrijf de template naar out (iets met write()); een waarde met write_to() streamt zichzelf"""
+        _render_parts(self.parts, out, values)
+
+    def render(self, values):
+        out = _Chunks()
+        self.render_to(out, values)
+        return "".join(out)
+
+    def render_split(self, values, field="content"):
+        """Render alles voor en na field als (kop, staart), voor het streamen van de inhoud.
+
+        ValueError als field niet precies één keer zonder opmaak in de template staat.
+        """
+        occurrences = [part for part in self.parts if part[1] == field]
+        if len(occurrences) != 1 or occurrences[0][2] or occurrences[0][3]:
+            raise ValueError(f"{{{field}}} moet precies één keer in de template staan")
+        index = self.parts.index(occurrences[0])
+        head, tail = _Chunks(), _Chunks()
+        _render_parts(self.parts[:index], head, values)
+        head.write(self.parts[index][0])
+        _render_parts(self.parts[index + 1:], tail, values)
+        return "".join(head), "".join(tail)
+
+
+class NoteTemplates:
+    """Gecompileerde templates uit de settings, een template map of de standaard.
+
+    Volgorde per template: settings["templates"][naam], dan <template_dir>/<naam>.md,
+    dan DEFAULT_TEMPLATES. Na een settings wijziging moet clear() aangeroepen worden.
+    """
+
+    def __init__(self):
+        self._compiled = {}
+
+    def get(self, name, settings):
+        template = self._compiled.get(name)
+        if template is None:
+            template = self._compiled[name] = self._compile(name, settings)
+        return template
+
+    def _compile(self, name, settings):
+        source = (settings.get("templates") or {}).get(name)
+        template_dir = settings.get("template_dir")
+        if not source and template_dir:
+            path = os.path.join(template_dir, f"{name}.md")
+            if os.path.isfile(path):
+                with open(path, encoding="utf-8") as f:
+                    source = f.read()
+        if source:
+            try:
+                return NoteTemplate(source)
+            except ValueError as e:
+                LOG.error(f"Template '{name}' ongeldig ({e}), standaard template gebruikt")
+        return NoteTemplate(DEFAULT_TEMPLATES[name])
+
+    def clear(self):
+        self._compiled = {}
@@ -0,0 +1,67 @@
+"""Laad de skill vanuit de source tree, met skill data en settings in een tijdelijke map"""
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PACKAGE = "ovos_skill_obsidianaddnote"
+
+# Niet in de echte OVOS config van de gebruiker schrijven
+os.environ.setdefault("XDG_CONFIG_HOME", tempfile.mkdtemp(prefix="obsidian-test-"))
+os.environ.setdefault("XDG_DATA_HOME", os.environ["XDG_CONFIG_HOME"])
+
+
+def load_skill_package():
+    if PACKAGE in sys.modules:
+        return sys.modules[PACKAGE]
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE, os.path.join(ROOT, "__init__.py"), submodule_search_locations=[ROOT])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+load_skill_package()
+
+
+def wait_for(condition, timeout=5.0):
+    """Wacht tot condition() waar is, voor werk op achtergrond threads"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def dictate(bus, title, lines=("regel 1", "regel 2"), session="default"):
+    """Speel een notitie af zoals de persona hem uitspreekt"""
+    from ovos_bus_client.message import Message
+    for utterance in ("NOTE", "Titel", title, "Doel", "testen", "Inhoud", *lines, "ENDNOTE"):
+        bus.emit(Message("speak", {"utterance": utterance, "meta": {"skill": "persona.openvoiceos"}},
+                         {"session": {"session_id": session}}))
+
+
+@pytest.fixture
+def make_skill():
+    """Maak skills op een FakeBus; dezelfde skill_id geeft dezelfde skill map, zoals na een herstart"""
+    from ovos_utils.fakebus import FakeBus
+    module = sys.modules[PACKAGE]
+    skills = []
+
+    def make(settings, skill_id=None):
+        bus = FakeBus()
+        skill = module.ObsidianAddNoteSkill(skill_id=skill_id or f"obsidian-test-{uuid.uuid4().hex[:8]}",
+                                            bus=bus, settings=settings)
+        skills.append(skill)
+        return skill, bus
+
+    yield make
+    for skill in skills:
+        skill.shutdown()
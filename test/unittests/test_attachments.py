@@ -0,0 +1,57 @@
+import os
+
+from conftest import dictate, wait_for
+
+
+def _make(make_skill, tmp_path, **attachments):
+    source_dir = tmp_path / "audio"
+    source_dir.mkdir()
+    skill, bus = make_skill({"storage": "memory", "pipeline": {"enabled": False},
+                             "upload_queue": {"enabled": False}, "journal": {"enabled": False},
+                             "attachments": {"source_dir": str(source_dir), **attachments}})
+    return skill, bus, source_dir
+
+
+def _send_audio(bus, path, session="default"):
+    from ovos_bus_client.message import Message
+    bus.emit(Message("obsidian.note.audio", {"path": str(path)}, {"session": {"session_id": session}}))
+
+
+def test_audio_inside_source_dir_is_uploaded_and_deleted(make_skill, tmp_path):
+    skill, bus, source_dir = _make(make_skill, tmp_path, delete_after_upload=True)
+    audio = source_dir / "dictaat.ogg"
+    audio.write_bytes(b"ogg")
+    _send_audio(bus, audio)
+    dictate(bus, "Met audio")
+    files = skill._get_storage().files
+    assert [path for path in files if path.endswith("_Met_audio.ogg")]
+    note = next(path for path in files if path.endswith("_Met_audio.md"))
+    assert "![[" in files[note]
+    assert not audio.exists()
+
+
+def test_audio_outside_source_dir_is_rejected_and_kept(make_skill, tmp_path):
+    skill, bus, source_dir = _make(make_skill, tmp_path, delete_after_upload=True)
+    secret = tmp_path / "id_rsa"
+    secret.write_bytes(b"geheim")
+    # Direct, via ".." en via een symlink in de source map
+    os.symlink(secret, source_dir / "link.ogg")
+    for path in (secret, source_dir / ".." / "id_rsa", source_dir / "link.ogg"):
+        _send_audio(bus, path)
+        assert skill.sessions.get("default").audio is None
+    dictate(bus, "Zonder audio")
+    files = skill._get_storage().files
+    assert len(files) == 1 and "![[" not in next(iter(files.values()))
+    assert secret.read_bytes() == b"geheim"
+
+
+def test_source_dir_is_checked_again_before_upload(make_skill, tmp_path):
+    skill, bus, source_dir = _make(make_skill, tmp_path, delete_after_upload=True)
+    audio = source_dir / "dictaat.ogg"
+    audio.write_bytes(b"ogg")
+    _send_audio(bus, audio)
+    # Bv. een gewijzigde source_dir, of een pad uit het journal
+    skill.settings["attachments"]["source_dir"] = str(tmp_path / "elders")
+    dictate(bus, "Later geweigerd")
+    assert wait_for(lambda: skill.metrics.snapshot()["counters"]["attachments_failed"] == 1)
+    assert audio.exists()
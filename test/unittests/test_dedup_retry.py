@@ -0,0 +1,27 @@
+from conftest import dictate, wait_for
+
+
+def test_failed_render_is_retried_and_not_treated_as_duplicate(make_skill):
+    skill, bus = make_skill({"storage": "memory", "pipeline": {"enabled": False},
+                             "upload_queue": {"backoff": 0.01}})
+    render = skill.create_markdown
+    calls = []
+
+    def flaky_render(*args, **kwargs):
+        calls.append(args[0])
+        if len(calls) == 1:
+            raise RuntimeError("render mislukt")
+        return render(*args, **kwargs)
+
+    skill.create_markdown = flaky_render
+    dictate(bus, "Opnieuw")
+    assert wait_for(lambda: skill.upload_queue.stats()["completed"] == 1)
+    assert len(calls) == 2
+    assert [path for path in skill._get_storage().files if path.endswith("_Opnieuw.md")]
+    assert skill.dedup.stats()["hits"] == 0
+    assert skill.dedup.stats()["pending"] == 0
+    assert skill.journal.stats()["pending"] == 0
+
+    # Dezelfde notitie nog eens is nu wel een echte dubbele
+    dictate(bus, "Opnieuw")
+    assert wait_for(lambda: skill.dedup.stats()["hits"] == 1)
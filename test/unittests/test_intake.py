@@ -0,0 +1,46 @@
+import threading
+
+from ovos_skill_obsidianaddnote.intake import NoteIntake
+
+
+def test_spill_keeps_order_per_session():
+    processed = []
+    release = threading.Event()
+
+    def handler(session_id, utterance):
+        release.wait(5)
+        processed.append((session_id, utterance))
+
+    intake = NoteIntake(handler, maxsize=2, overflow="spill")
+    intake.start()
+    events = [(f"s{i % 3}", f"regel {i}") for i in range(30)]
+    for session_id, utterance in events:
+        assert intake.submit(session_id, utterance)
+    assert intake.stats()["spilled"] > 0
+    release.set()
+    intake.stop(drain=True)
+    assert processed == events
+    assert intake.stats()["dropped"] == 0
+
+
+def test_full_queue_drops_events_that_are_not_part_of_a_note():
+    started, release = threading.Event(), threading.Event()
+    processed = []
+
+    def handler(session_id, utterance):
+        started.set()
+        release.wait(5)
+        processed.append(utterance)
+
+    intake = NoteIntake(handler, maxsize=1, overflow="spill",
+                        is_relevant=lambda session_id, utterance: utterance != "babbel")
+    intake.start()
+    intake.submit("s", "NOTE")
+    assert started.wait(5)  # de consumer zit in de handler, de wachtrij is leeg
+    assert intake.submit("s", "Titel")  # vult de wachtrij
+    assert not intake.submit("s", "babbel")
+    assert intake.submit("s", "ENDNOTE")  # overloop, op volgorde na Titel
+    release.set()
+    intake.stop(drain=True)
+    assert processed == ["NOTE", "Titel", "ENDNOTE"]
+    assert intake.stats()["dropped"] == 1
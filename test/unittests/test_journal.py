@@ -0,0 +1,170 @@
+import os
+import threading
+from datetime import datetime
+
+from ovos_bus_client.message import Message
+
+from ovos_skill_obsidianaddnote.journal import NoteJournal
+from ovos_skill_obsidianaddnote.storage import MemoryStorage
+
+from conftest import dictate, wait_for
+
+
+def _note(title):
+    return {"titel": title, "doel": "testen", "inhoud": "regel\n", "timestamp": datetime(2026, 1, 2, 3, 4, 5)}
+
+
+def test_pending_notes_survive_reload_and_compaction(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = NoteJournal(path, compact_after=0)
+    journal.add_note("a", _note("Een"))
+    journal.add_note("b", _note("Twee"))
+    journal.done("a")
+    journal.track("sat1", "NOTE", begin=True)
+    journal.track("sat1", "Titel")
+    journal.close()
+
+    journal = NoteJournal(path, compact_after=0)
+    assert [note["titel"] for note in journal.pending()] == ["Twee"]
+    assert journal.pending()[0]["timestamp"] == datetime(2026, 1, 2, 3, 4, 5)
+    assert journal.open_sessions() == {"sat1": ["NOTE", "Titel"]}
+
+    journal.compact()
+    journal.close()
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 3  # één notitie en twee utterances, zonder "done" records
+    journal = NoteJournal(path, compact_after=0)
+    assert journal.stats() == {"pending": 1, "open_sessions": 1, "dead": 0}
+    journal.close()
+
+
+def test_journal_entry_survives_restart_and_resync_marks_it_done(make_skill):
+    settings = {"storage": "memory", "upload_queue": {"enabled": False}, "pipeline": {"enabled": False},
+                "dedup": {"enabled": False}}
+    skill, bus = make_skill(settings, skill_id="obsidian-test-restart")
+    storage = skill._get_storage()
+    storage.write_notes = lambda notes: [IOError("vault onbereikbaar")] * len(notes)
+    dictate(bus, "Na herstart")
+    assert skill.journal.stats()["pending"] == 1
+    skill.shutdown()
+
+    # Zelfde skill map: het journal wordt ingelezen en bij het starten in één resync geüpload
+    skill, bus = make_skill(settings, skill_id="obsidian-test-restart")
+    assert wait_for(lambda: skill.journal.stats()["pending"] == 0)
+    assert isinstance(skill.storage, MemoryStorage)
+    assert [path for path in skill.storage.files if path.endswith("_Na_herstart.md")]
+
+
+def test_prepared_note_and_attempts_survive_reload_until_dead(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = NoteJournal(path, compact_after=0, max_attempts=2)
+    journal.add_note("a", _note("Een"))
+    journal.prepared("a", {"path": "x_Een.md", "markdown": "# Een\n", "hash": None, "title": "Een"})
+    assert not journal.failed("a", IOError("weg"))
+    journal.close()
+
+    journal = NoteJournal(path, compact_after=0, max_attempts=2)
+    assert journal.pending()[0]["prepared"]["markdown"] == "# Een\n"
+    assert journal.failed("a", IOError("weg"))
+    assert journal.pending() == []
+    journal.compact()
+    journal.close()
+
+    # Opgegeven notities blijven na compact() in het bestand, tot revive()
+    journal = NoteJournal(path, compact_after=0, max_attempts=2)
+    assert journal.stats() == {"pending": 0, "open_sessions": 0, "dead": 1}
+    assert journal.revive() == 1
+    assert [note["titel"] for note in journal.pending()] == ["Een"]
+    assert not journal.failed("a", IOError("weg"))  # de telling begint opnieuw
+    journal.close()
+
+
+def _failing_skill(make_skill, tmp_path, **journal):
+    source_dir = tmp_path / "audio"
+    source_dir.mkdir()
+    skill, bus = make_skill({"storage": "memory", "pipeline": {"enabled": False},
+                             "upload_queue": {"enabled": False}, "journal": {"resync_interval": 0, **journal},
+                             "attachments": {"source_dir": str(source_dir), "delete_after_upload": True}})
+    storage = skill._get_storage()
+    write = storage.write_notes
+    writes = []
+
+    def unreachable(notes):
+        writes.append(len(notes))
+        return [IOError("vault onbereikbaar")] * len(notes)
+
+    storage.write_notes = unreachable
+    return skill, bus, source_dir, write, writes
+
+
+def test_resync_writes_the_rendered_note_without_uploading_audio_again(make_skill, tmp_path):
+    skill, bus, source_dir, write, _ = _failing_skill(make_skill, tmp_path)
+    storage = skill._get_storage()
+    upload_file = storage.upload_file
+    uploads = []
+
+    def counting_upload(local_path, path, **kwargs):
+        uploads.append(path)
+        return upload_file(local_path, path, **kwargs)
+
+    storage.upload_file = counting_upload
+    audio = source_dir / "dictaat.ogg"
+    audio.write_bytes(b"ogg")
+    bus.emit(Message("obsidian.note.audio", {"path": str(audio)}, {"session": {"session_id": "default"}}))
+    dictate(bus, "Met audio")
+    assert not audio.exists()  # de bijlage staat al in de vault
+    assert skill.journal.stats()["pending"] == 1
+
+    storage.write_notes = write
+    skill._resync_journal()
+    assert skill.journal.stats()["pending"] == 0
+    assert len(uploads) == 1
+    note = next(path for path in storage.files if path.endswith("_Met_audio.md"))
+    assert "![[" in storage.files[note]
+    assert skill.dedup.stats()["pending"] == 0
+
+
+def test_failing_note_is_given_up_and_retried_on_request(make_skill, tmp_path):
+    skill, bus, _, write, writes = _failing_skill(make_skill, tmp_path, max_attempts=2)
+    dictate(bus, "Kapot")
+    skill._resync_journal()
+    skill._resync_journal()
+    assert skill.journal.stats()["dead"] == 1
+    attempts = len(writes)
+    skill._resync_journal()
+    assert len(writes) == attempts  # opgegeven notities worden niet meer geprobeerd
+
+    storage = skill._get_storage()
+    storage.write_notes = write
+    bus.emit(Message("obsidian.note.retry"))
+    assert wait_for(lambda: skill.journal.stats() == {"pending": 0, "open_sessions": 0, "dead": 0})
+    assert [path for path in storage.files if path.endswith("_Kapot.md")]
+
+
+def test_note_is_fsynced_on_the_upload_thread_not_at_endnote(make_skill, monkeypatch):
+    fsync = os.fsync
+    synced = []
+
+    def recording_fsync(fd):
+        synced.append(threading.current_thread().name)
+        fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", recording_fsync)
+    skill, bus = make_skill({"storage": "memory", "pipeline": {"enabled": False}})
+    dictate(bus, "Duurzaam")  # FakeBus: ENDNOTE wordt op deze thread afgehandeld
+    assert wait_for(lambda: skill.upload_queue.stats()["completed"] == 1)
+    assert threading.current_thread().name not in synced
+    assert any(name.startswith("ObsidianUpload") for name in synced)
+
+
+def test_one_sync_covers_every_note_written_before_it(tmp_path, monkeypatch):
+    journal = NoteJournal(str(tmp_path / "journal.jsonl"))
+    synced = []
+    monkeypatch.setattr(os, "fsync", synced.append)
+    journal.add_note("a", _note("Een"))
+    journal.add_note("b", _note("Twee"))
+    assert synced == []
+    journal.sync()
+    journal.sync()
+    assert len(synced) == 1
+    journal.close()
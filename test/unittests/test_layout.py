@@ -0,0 +1,118 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from ovos_skill_obsidianaddnote.layout import layout_pattern, migrate, name_timestamp, shard_dir
+
+
+class LocalSFTP:
+    """Het deel van paramiko's SFTPClient dat migrate gebruikt, op een lokale map"""
+
+    def __init__(self):
+        self.listings = []
+
+    def listdir_attr(self, path):
+        self.listings.append(path)
+        attrs = []
+        for name in sorted(os.listdir(path)):
+            attr = os.stat(os.path.join(path, name))
+            attr = type("Attr", (), {"filename": name, "st_mode": attr.st_mode, "st_mtime": attr.st_mtime})
+            attrs.append(attr)
+        return attrs
+
+    def listdir(self, path):
+        self.listings.append(path)
+        return os.listdir(path)
+
+    def rename(self, source, target):
+        os.rename(source, target)
+
+
+class LocalConnection:
+    def __init__(self):
+        self.sftp = LocalSFTP()
+
+    def run(self, func):
+        return func(self.sftp)
+
+    def ensure_dir(self, sftp, path):
+        os.makedirs(path, exist_ok=True)
+
+
+def test_shard_dir():
+    timestamp = datetime(2026, 12, 29, 8, 30)
+    assert shard_dir(timestamp, "flat") == ""
+    assert shard_dir(timestamp, None) == ""
+    assert shard_dir(timestamp, "day") == "2026/12/29"
+    assert shard_dir(timestamp, "month") == "2026/12"
+    assert shard_dir(timestamp, "week") == "2026/W53"
+    assert shard_dir(datetime(2024, 12, 30), "week") == "2025/W01"  # ISO jaar, niet het kalenderjaar
+    assert shard_dir(timestamp, "/%Y/") == "2026"
+
+
+@pytest.mark.parametrize("layout", ["daily", "%Y/../%m", "2026"])
+def test_unknown_layout_is_rejected(layout):
+    with pytest.raises(ValueError):
+        layout_pattern(layout)
+
+
+def test_name_timestamp():
+    assert name_timestamp("20260102_030405_Titel.md") == datetime(2026, 1, 2, 3, 4, 5)
+    assert name_timestamp("20260102_030405_Titel.ogg") == datetime(2026, 1, 2, 3, 4, 5)
+    assert name_timestamp("2026-01-02.md") == datetime(2026, 1, 2)
+    assert name_timestamp("Boodschappen.md") is None
+
+
+def _touch(path, text="x"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def test_migrate_moves_files_into_shards(tmp_path):
+    for name in ("20260102_030405_Een.md", "20260102_090000_Twee.md", "20260203_101010_Drie.md",
+                 "2026-01-02.md", "Los.md", ".verborgen"):
+        _touch(tmp_path / name)
+    (tmp_path / ".obsidian").mkdir()
+    connection = LocalConnection()
+    result = migrate(connection, str(tmp_path), "day")
+    assert result == {"moved": 4, "skipped": 1, "failed": 0, "shards": 2}
+    assert sorted(os.listdir(tmp_path / "2026/01/02")) == [
+        "2026-01-02.md", "20260102_030405_Een.md", "20260102_090000_Twee.md"]
+    assert os.listdir(tmp_path / "2026/02/03") == ["20260203_101010_Drie.md"]
+    assert sorted(os.listdir(tmp_path)) == [".obsidian", ".verborgen", "2026", "Los.md"]
+    # Eén listing van de bron en één per shard
+    assert len(connection.sftp.listings) == 3
+
+
+def test_migrate_does_not_overwrite_and_dry_run_changes_nothing(tmp_path):
+    _touch(tmp_path / "20260102_030405_Een.md", "nieuw")
+    _touch(tmp_path / "2026/01/02/20260102_030405_Een.md", "bestaand")
+    _touch(tmp_path / "20260103_030405_Twee.md")
+
+    result = migrate(LocalConnection(), str(tmp_path), "day", dry_run=True)
+    assert result == {"moved": 1, "skipped": 0, "failed": 1, "shards": 2}
+    assert not (tmp_path / "2026/01/03").exists()
+
+    result = migrate(LocalConnection(), str(tmp_path), "day")
+    assert result["moved"] == 1 and result["failed"] == 1
+    assert (tmp_path / "2026/01/02/20260102_030405_Een.md").read_text() == "bestaand"
+    assert (tmp_path / "20260102_030405_Een.md").read_text() == "nieuw"
+
+
+def test_migrate_with_mtime_and_flat_layout(tmp_path):
+    _touch(tmp_path / "Los.md")
+    os.utime(tmp_path / "Los.md", (datetime(2025, 5, 6).timestamp(),) * 2)
+    assert migrate(LocalConnection(), str(tmp_path), "month", use_mtime=True)["moved"] == 1
+    assert (tmp_path / "2025/05/Los.md").exists()
+    with pytest.raises(ValueError):
+        migrate(LocalConnection(), str(tmp_path), "flat")
+
+
+def test_skill_writes_notes_into_the_shard_of_their_timestamp(make_skill):
+    skill, _ = make_skill({"storage": "memory", "layout": "month", "pipeline": {"enabled": False},
+                           "upload_queue": {"enabled": False}, "journal": {"enabled": False}})
+    skill.add_note("Gesharde", "testen", "regel", timestamp=datetime(2026, 3, 4, 5, 6, 7))
+    assert list(skill._get_storage().files) == ["2026/03/20260304_050607_Gesharde.md"]
+    skill.settings["layout"] = "%Y/../%m"
+    assert skill._note_path("Plat", datetime(2026, 3, 4)) == "20260304_000000_Plat.md"
@@ -0,0 +1,26 @@
+from conftest import dictate, wait_for
+
+
+def test_parse_stage_is_measured_once_per_note(make_skill):
+    skill, bus = make_skill({"storage": "memory", "upload_queue": {"enabled": False},
+                             "pipeline": {"enabled": False}, "journal": {"enabled": False}})
+    dictate(bus, "Een")
+    dictate(bus, "Twee")
+    assert skill.metrics.snapshot()["stages"]["parse"]["count"] == 2
+
+
+def test_intake_consumer_reuses_the_classification_of_the_bus_thread(make_skill, monkeypatch):
+    import ovos_skill_obsidianaddnote as package
+    skill, bus = make_skill({"storage": "memory", "upload_queue": {"enabled": False},
+                             "pipeline": {"enabled": False}, "journal": {"enabled": False},
+                             "intake": {"enabled": True}})
+    calls = []
+    classify = package.classify_utterance
+
+    def counting(utterance):
+        calls.append(utterance)
+        return classify(utterance)
+    monkeypatch.setattr(package, "classify_utterance", counting)
+    dictate(bus, "Eenmaal")
+    assert wait_for(lambda: skill.metrics.counters["notes_finalized"] == 1)
+    assert len(calls) == len(set(calls)) == 9  # elke utterance van het dictaat precies één keer
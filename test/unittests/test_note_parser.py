@@ -0,0 +1,78 @@
+import pytest
+
+from ovos_skill_obsidianaddnote.note_parser import (BLOCK, ENDNOTE, LABEL, NOTE, TEXT, block_ended,
+                                                    classify_utterance, label_value, parse_block)
+
+
+@pytest.mark.parametrize("utterance, expected", [
+    ("NOTE", (NOTE, None)),
+    ("[NOTE]", (NOTE, None)),
+    ("note", (NOTE, None)),
+    ("ENDNOTE", (ENDNOTE, "")),
+    ("laatste regel [ENDNOTE]", (ENDNOTE, "laatste regel")),
+    ("Titel", (LABEL, "titel")),
+    ("Inhoud: eerste regel", (LABEL, "inhoud")),
+    ("NOTE Titel: Boodschappen", (BLOCK, "NOTE Titel: Boodschappen")),
+    ("gewone regel", (TEXT, "gewone regel")),
+    # "note" zonder woordgrens is geen marker, de voorselectie mag dat niet veranderen
+    ("notebook en footnotes", (TEXT, "notebook en footnotes")),
+    ("Notenboom", (TEXT, "Notenboom")),
+])
+def test_classify_utterance(utterance, expected):
+    assert classify_utterance(utterance) == expected
+
+
+def test_parse_block_from_one_utterance():
+    text = "NOTE Titel: Boodschappen Doel: lijstje Inhoud: melk\nbrood  ENDNOTE"
+    assert parse_block(text) == ("Boodschappen", "lijstje", ["melk", "brood"])
+
+
+def test_parse_block_with_brackets_and_mixed_case():
+    text = "[NOTE] titel:Een  doel : twee INHOUD: drie [ENDNOTE]"
+    assert parse_block(text) == ("Een", "twee", ["drie"])
+
+
+def test_incomplete_block_is_not_parsed():
+    assert parse_block("NOTE Titel: Een Doel: twee") is None
+    assert parse_block("NOTE Titel: Een Inhoud: drie ENDNOTE") is None
+    assert not block_ended("NOTE Titel: Een Doel: twee")
+    assert block_ended("Inhoud: drie endnote")
+
+
+def test_label_value():
+    assert label_value("Titel: Boodschappen ") == "Boodschappen"
+    assert label_value("Titel") == ""
+
+
+def _speak(bus, utterance, session="default"):
+    from ovos_bus_client.message import Message
+    bus.emit(Message("speak", {"utterance": utterance, "meta": {"skill": "persona.openvoiceos"}},
+                     {"session": {"session_id": session}}))
+
+
+def _notes(skill):
+    return sorted(path for path in skill._get_storage().files if path.endswith(".md"))
+
+
+def test_compact_block_over_several_utterances_is_written(make_skill):
+    skill, bus = make_skill({"storage": "memory", "upload_queue": {"enabled": False},
+                             "pipeline": {"enabled": False}, "journal": {"enabled": False}})
+    _speak(bus, "NOTE Titel: Compact Doel: testen")
+    _speak(bus, "Inhoud: een regel")
+    assert _notes(skill) == []
+    _speak(bus, "nog een regel ENDNOTE")
+    notes = _notes(skill)
+    assert len(notes) == 1 and notes[0].endswith("_Compact.md")
+    markdown = skill._get_storage().files[notes[0]]
+    assert "een regel\nnog een regel" in markdown
+
+
+def test_compact_block_that_does_not_parse_falls_back_to_the_labels(make_skill):
+    skill, bus = make_skill({"storage": "memory", "upload_queue": {"enabled": False},
+                             "pipeline": {"enabled": False}, "journal": {"enabled": False}})
+    # Doel en Inhoud zonder ":" passen niet in het blok formaat, de regels gaan alsnog door de gewone verwerking
+    for utterance in ("NOTE Titel: Terugval", "Doel", "testen", "Inhoud", "regel", "ENDNOTE"):
+        _speak(bus, utterance)
+    notes = _notes(skill)
+    assert len(notes) == 1 and notes[0].endswith("_Terugval.md")
+    assert "## Inhoud\nregel\n" in skill._get_storage().files[notes[0]]
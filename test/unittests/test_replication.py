@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+
+from ovos_skill_obsidianaddnote.replication import ReplicatedStorage
+from ovos_skill_obsidianaddnote.storage import MemoryStorage
+
+from conftest import dictate, wait_for
+
+
+class FlakyStorage(MemoryStorage):
+    """MemoryStorage waarvan de eerste `failures` writes mislukken"""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+        self.attempts = 0
+
+    def write_notes(self, notes):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            return [IOError("target onbereikbaar")] * len(notes)
+        return super().write_notes(notes)
+
+
+def _note(path):
+    return {"path": path, "markdown": f"# {path}\n"}
+
+
+def test_quorum_one_of_two_succeeds_and_retries_the_other_target():
+    primary, lagging = MemoryStorage(), FlakyStorage(failures=1)
+    storage = ReplicatedStorage([("a", primary), ("b", lagging)], quorum=1, backoff=0.01)
+    try:
+        assert storage.write_notes([_note("een.md")]) == [None]
+        assert "een.md" in primary.files
+        assert wait_for(lambda: "een.md" in lagging.files)
+        stats = storage.stats()
+        assert stats["b"]["retries"] == 1 and stats["b"]["lost"] == 0
+    finally:
+        storage.close()
+
+
+def test_quorum_that_cannot_be_met_returns_an_error():
+    storage = ReplicatedStorage([("a", MemoryStorage()), ("b", FlakyStorage(failures=10))],
+                                quorum=2, backoff=0.01)
+    try:
+        results = storage.write_notes([_note("een.md")])
+        assert isinstance(results[0], Exception)
+    finally:
+        storage.close()
+
+
+class SlowStorage(MemoryStorage):
+    """MemoryStorage die een bijlage pas na `delay` seconden begint te lezen"""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def upload_file(self, local_path, path, chunk_size=32768, window=64, on_done=None):
+        time.sleep(self.delay)
+        return super().upload_file(local_path, path, chunk_size, window, on_done)
+
+
+def test_attachment_is_released_only_after_the_lagging_target_has_it(tmp_path):
+    audio = tmp_path / "dictaat.wav"
+    audio.write_bytes(b"wav")
+    primary, lagging = MemoryStorage(), SlowStorage(delay=0.3)
+    storage = ReplicatedStorage([("a", primary), ("b", lagging)], quorum=1, backoff=0.01)
+    released = threading.Event()
+    try:
+        assert storage.upload_file(str(audio), "dictaat.wav", on_done=released.set) == 3
+        assert "dictaat.wav" in primary.files
+        assert not released.is_set()
+        assert released.wait(5)
+        assert lagging.files["dictaat.wav"] == b"wav"
+    finally:
+        storage.close()
+
+
+def test_attachment_is_released_when_a_target_gives_up(tmp_path):
+    audio = tmp_path / "dictaat.wav"
+    audio.write_bytes(b"wav")
+
+    class Broken(MemoryStorage):
+        def upload_file(self, *args, **kwargs):
+            raise IOError("target onbereikbaar")
+    storage = ReplicatedStorage([("a", MemoryStorage()), ("b", Broken())], quorum=1, max_retries=2, backoff=0.01)
+    released = threading.Event()
+    try:
+        storage.upload_file(str(audio), "dictaat.wav", on_done=released.set)
+        assert released.wait(5)
+        assert storage.stats()["b"]["lost"] == 1
+    finally:
+        storage.close()
+
+
+def test_skill_deletes_audio_only_after_every_target_has_it(make_skill, tmp_path):
+    source_dir = tmp_path / "audio"
+    source_dir.mkdir()
+    audio = source_dir / "dictaat.wav"
+    audio.write_bytes(b"wav")
+    skill, bus = make_skill({"pipeline": {"enabled": False}, "upload_queue": {"enabled": False},
+                             "journal": {"enabled": False},
+                             "attachments": {"source_dir": str(source_dir), "delete_after_upload": True},
+                             "replication": {"quorum": 1}, "targets": [
+                                 {"name": "a", "storage": "local", "local_path": str(tmp_path / "a")},
+                                 {"name": "b", "storage": "local", "local_path": str(tmp_path / "b")}]})
+    storage = skill._get_storage()
+    lagging = storage.targets[1][1]
+    upload = lagging.upload_file
+
+    def slow_upload(*args, **kwargs):
+        time.sleep(0.3)
+        return upload(*args, **kwargs)
+    lagging.upload_file = slow_upload
+    from ovos_bus_client.message import Message
+    bus.emit(Message("obsidian.note.audio", {"path": str(audio)}, {"session": {"session_id": "default"}}))
+    dictate(bus, "Replica")
+    assert wait_for(lambda: not audio.exists())
+    # De notitie zelf komt op b pas na de bijlage, op dezelfde writer thread
+    for target in ("a", "b"):
+        assert wait_for(lambda: sorted(name.rsplit("_", 1)[-1] for name in os.listdir(tmp_path / target)
+                                       if not name.startswith(".")) == ["Replica.md", "Replica.wav"])
+    assert all(stats["lost"] == 0 and stats["failures"] == 0 for stats in storage.stats().values())
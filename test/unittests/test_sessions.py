@@ -0,0 +1,83 @@
+import time
+
+from ovos_skill_obsidianaddnote.sessions import NoteSessionRegistry
+
+from conftest import dictate
+
+
+def _registry(**kwargs):
+    evicted = []
+    registry = NoteSessionRegistry(dict, on_evict=lambda session, reason: evicted.append(
+        (session.session_id, reason)), **kwargs)
+    return registry, evicted
+
+
+def test_least_recently_active_session_is_evicted_at_max_sessions():
+    registry, evicted = _registry(idle_timeout=0, max_sessions=2)
+    first = registry.get("a")
+    registry.get("b")
+    assert registry.get("a") is first  # a is nu de meest recente
+    registry.get("c")
+    assert evicted == [("b", "max_sessions")]
+    assert [session.session_id for session in registry.sessions()] == ["a", "c"]
+    assert registry.evicted == 1
+
+
+def test_idle_sessions_are_evicted():
+    registry, evicted = _registry(idle_timeout=60, max_sessions=8)
+    registry.get("a")
+    registry.get("b")
+    registry.sessions()[0].last_seen -= 120
+    registry._next_idle_check = 0
+    registry.get("a")  # weer actief, dus niet meer idle
+    assert evicted == []
+    registry.sessions()[0].last_seen -= 120  # b, nu de minst recent actieve
+    registry._next_idle_check = 0
+    registry.get("c")
+    assert evicted == [("b", "idle")]
+    assert [session.session_id for session in registry.sessions()] == ["a", "c"]
+
+
+def test_idle_check_is_throttled():
+    registry, evicted = _registry(idle_timeout=60, max_sessions=8)
+    registry.get("a")
+    registry.get("b")
+    registry.sessions()[0].last_seen = time.monotonic() - 120
+    registry.get("b")  # binnen idle_timeout / 10 na de vorige controle: niet gezocht
+    assert evicted == []
+
+
+def test_sessions_collect_notes_independently(make_skill):
+    skill, bus = make_skill({"storage": "memory", "pipeline": {"enabled": False},
+                             "upload_queue": {"enabled": False}, "journal": {"enabled": False}})
+    from ovos_bus_client.message import Message
+
+    def speak(utterance, session):
+        bus.emit(Message("speak", {"utterance": utterance, "meta": {"skill": "persona.openvoiceos"}},
+                         {"session": {"session_id": session}}))
+
+    # Twee satellieten door elkaar
+    for first, second in zip(("NOTE", "Titel", "Keuken", "Doel", "a", "Inhoud", "k1"),
+                             ("NOTE", "Titel", "Zolder", "Doel", "b", "Inhoud", "z1")):
+        speak(first, "keuken")
+        speak(second, "zolder")
+    speak("ENDNOTE", "zolder")
+    speak("ENDNOTE", "keuken")
+    files = skill._get_storage().files
+    keuken = next(markdown for path, markdown in files.items() if path.endswith("_Keuken.md"))
+    zolder = next(markdown for path, markdown in files.items() if path.endswith("_Zolder.md"))
+    assert "k1" in keuken and "z1" not in keuken
+    assert "z1" in zolder and "k1" not in zolder
+
+
+def test_evicted_session_drops_its_unfinished_note(make_skill):
+    skill, bus = make_skill({"storage": "memory", "pipeline": {"enabled": False},
+                             "upload_queue": {"enabled": False}, "journal": {"enabled": False},
+                             "sessions": {"max_sessions": 1}})
+    from ovos_bus_client.message import Message
+    bus.emit(Message("speak", {"utterance": "NOTE", "meta": {"skill": "persona.openvoiceos"}},
+                     {"session": {"session_id": "verlaten"}}))
+    dictate(bus, "Andere", session="actief")
+    assert skill.sessions.evicted == 1
+    assert [session.session_id for session in skill.sessions.sessions()] == ["actief"]
+    assert len(skill._get_storage().files) == 1
@@ -0,0 +1,118 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ovos_skill_obsidianaddnote.storage import MemoryStorage
+from ovos_skill_obsidianaddnote.streaming import NoteStream
+
+from conftest import dictate, wait_for
+
+
+class RecordingHandle:
+    def __init__(self, fail_on=None):
+        self.parts = []
+        self.committed = self.aborted = False
+        self.fail_on = fail_on
+
+    def write(self, text):
+        if self.fail_on and self.fail_on in text:
+            raise IOError("schijf vol")
+        self.parts.append(text)
+
+    def commit(self):
+        self.committed = True
+
+    def abort(self):
+        self.aborted = True
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=1)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def test_commit_writes_head_lines_and_tail_in_order(executor):
+    handle = RecordingHandle()
+    stream = NoteStream(executor, lambda: (handle, "kop\n", "staart\n"), "notitie.md", None)
+    for line in ("een\n", "twee\n", "drie\n"):
+        stream.append(line)
+    assert stream.finish(timeout=5) is None
+    assert "".join(handle.parts) == "kop\neen\ntwee\ndrie\nstaart\n"
+    assert handle.committed and not handle.aborted
+    assert stream.bytes == len("kop\neen\ntwee\ndrie\nstaart\n")
+
+
+def test_write_error_aborts_and_stops_the_stream(executor):
+    handle = RecordingHandle(fail_on="twee")
+    stream = NoteStream(executor, lambda: (handle, "kop\n", "staart\n"), "notitie.md", None)
+    stream.append("een\n")
+    stream.append("twee\n")
+    stream.append("drie\n")
+    assert isinstance(stream.finish(timeout=5), IOError)
+    assert handle.aborted and not handle.committed
+    assert "drie\n" not in "".join(handle.parts)
+
+
+def test_open_error_is_returned_by_finish(executor):
+    def opener():
+        raise IOError("geen verbinding")
+    stream = NoteStream(executor, opener, "notitie.md", None)
+    stream.append("een\n")
+    assert isinstance(stream.finish(timeout=5), IOError)
+
+
+def test_finish_timeout_aborts_instead_of_committing_late(executor):
+    blocked = threading.Event()
+    handle = RecordingHandle()
+
+    def opener():
+        blocked.wait(5)
+        return handle, "kop\n", "staart\n"
+    stream = NoteStream(executor, opener, "notitie.md", None)
+    assert stream.finish(timeout=0.05) is not None
+    blocked.set()
+    assert wait_for(lambda: handle.aborted)
+    assert not handle.committed
+
+
+def test_abort_discards_the_note(executor):
+    handle = RecordingHandle()
+    stream = NoteStream(executor, lambda: (handle, "kop\n", "staart\n"), "notitie.md", None)
+    stream.append("een\n")
+    stream.abort()
+    assert wait_for(lambda: handle.aborted)
+    assert stream.finish(timeout=5) is not None
+    assert not handle.committed
+
+
+def _streaming_skill(make_skill):
+    return make_skill({"storage": "memory", "streaming": {"enabled": True},
+                       "upload_queue": {"enabled": False}, "journal": {"enabled": False},
+                       "dedup": {"enabled": False}})
+
+
+def test_streamed_note_is_committed_at_endnote(make_skill):
+    skill, bus = _streaming_skill(make_skill)
+    dictate(bus, "Gestreamd")
+    assert wait_for(lambda: skill.metrics.snapshot()["counters"]["notes_streamed"] == 1)
+    files = skill._get_storage().files
+    assert len(files) == 1
+    assert "regel 1\nregel 2\n" in next(iter(files.values()))
+
+
+def test_failed_stream_falls_back_to_a_whole_upload(make_skill):
+    skill, bus = _streaming_skill(make_skill)
+    storage = skill._get_storage()
+    assert isinstance(storage, MemoryStorage)
+
+    def open_stream(path, atomic=True):
+        raise IOError("stream niet te openen")
+    storage.open_stream = open_stream
+    dictate(bus, "Terugval")
+    assert wait_for(lambda: [path for path in storage.files if path.endswith("_Terugval.md")])
+    counters = skill.metrics.snapshot()["counters"]
+    assert counters["stream_failures"] == 1 and counters["notes_streamed"] == 0
+    assert "regel 1\nregel 2\n" in next(iter(storage.files.values()))
@@ -0,0 +1,15 @@
+import pytest
+
+
+def test_invalid_template_falls_back_to_default(make_skill):
+    skill, _ = make_skill({"storage": "memory", "templates": {"note": "# {title:d}\n{content}"}})
+    template = skill.templates.get("note", skill.settings)
+    assert template.source.startswith("# {title}\n")
+
+
+def test_template_with_bad_spec_or_field_is_rejected_at_compile_time():
+    from ovos_skill_obsidianaddnote.templates import NoteTemplate
+    for source in ("# {title:d}", "# {title!a}", "# {onbekend}"):
+        with pytest.raises(ValueError):
+            NoteTemplate(source)
+    assert NoteTemplate("# {title!r}").render({"title": "x"}) == "# 'x'"
@@ -0,0 +1,53 @@
+import threading
+import time
+
+from conftest import dictate, wait_for
+
+
+def _speak(bus, utterance, session):
+    from ovos_bus_client.message import Message
+    bus.emit(Message("speak", {"utterance": utterance, "meta": {"skill": "persona.openvoiceos"}},
+                     {"session": {"session_id": session}}))
+
+
+def _blocked_skill(make_skill):
+    skill, bus = make_skill({"storage": "memory", "api_key": "test", "city": "Utrecht",
+                             "upload_queue": {"enabled": False}, "journal": {"enabled": False},
+                             "dedup": {"enabled": False}, "weather_deadline": 0.2})
+    weather = skill.weather
+    weather._cache[("Utrecht", weather.lang, weather.units)] = ("licht bewolkt, 15°C", time.monotonic())
+    storage = skill._get_storage()
+    release, calls = threading.Event(), []
+
+    def warm_up():
+        calls.append(1)
+        release.wait(5)  # bv. een lange bijlage upload op dezelfde verbinding
+    storage.warm_up = warm_up
+    storage.is_warm = lambda: False
+    return skill, bus, release, calls
+
+
+def test_blocked_warm_ups_do_not_delay_the_weather(make_skill):
+    skill, bus, release, calls = _blocked_skill(make_skill)
+    try:
+        for i in range(4):
+            _speak(bus, "NOTE", f"sat{i}")
+        dictate(bus, "Vijfde", session="sat4")
+        files = skill._get_storage().files
+        markdown = next(markdown for path, markdown in files.items() if path.endswith("_Vijfde.md"))
+        assert "Weer: licht bewolkt, 15°C" in markdown
+        assert skill.metrics.counters["weather_timeouts"] == 0
+        # Eén warm-up tegelijk, de andere sessies delen hem
+        assert len(calls) == 1
+        assert skill.metrics.counters["warm_ups_skipped"] >= 4
+    finally:
+        release.set()
+
+
+def test_no_warm_up_while_the_connection_is_open(make_skill):
+    skill, bus, release, calls = _blocked_skill(make_skill)
+    release.set()
+    skill._get_storage().is_warm = lambda: True
+    dictate(bus, "Warm")
+    assert calls == []
+    assert wait_for(lambda: skill.metrics.counters["warm_ups_used"] == 1)
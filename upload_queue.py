@@ -0,0 +1,170 @@
+import queue
+import threading
+import time
+from ovos_utils.log import LOG
+
+_STOP = object()
+
+
+class NoteUploadQueue:
+    """Begrensde wachtrij met worker threads die notities op de achtergrond uploaden.
+
+    handler(items) krijgt een lijst notities en geeft per notitie None (gelukt)
+    of de exception terug. Mislukte notities worden na een backoff opnieuw
+    aangeboden; een exception uit handler zelf geldt voor de hele batch.
+
+    Met batch_size > 1 wacht een worker na de eerste notitie maximaal linger
+    seconden op meer notities, zodat die in één sessie geschreven worden.
+    on_failure(item, error) wordt aangeroepen als een notitie definitief mislukt.
+    """
+
+    def __init__(self, handler, workers=1, maxsize=50, max_retries=3,
+                 backoff=2.0, batch_size=1, linger=0.5, name="ObsidianUpload",
+                 on_failure=None):
+        self.handler = handler
+        self.on_failure = on_failure
+        self.workers = max(1, int(workers))
+        self.max_retries = max(0, int(max_retries))
+        self.backoff = backoff
+        self.batch_size = max(1, int(batch_size))
+        self.linger = linger
+        self.name = name
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "retries": 0,
+            "rejected": 0,
+            "batches": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+            "latency_last": 0.0
+        }
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, item):
+        """Zet een notitie in de wachtrij zonder te blokkeren, False als de wachtrij vol is"""
+        if self._stopping.is_set():
+            return False
+        try:
+            self._queue.put_nowait((item, time.monotonic()))
+        except queue.Full:
+            self._count("rejected")
+            return False
+        self._count("submitted")
+        return True
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                self._queue.task_done()
+                return
+            batch = [entry]
+            stop = self._collect(batch)
+            try:
+                self._process(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                self._queue.task_done()
+                return
+
+    def _collect(self, batch):
+        """Vul de batch aan binnen het linger venster, True als er een stop langskwam"""
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if entry is _STOP:
+                return True
+            batch.append(entry)
+        return False
+
+    def _process(self, batch):
+        pending = [(item, enqueued) for item, enqueued in batch]
+        attempt = 0
+        while pending:
+            self._count("batches")
+            try:
+                results = self.handler([item for item, _ in pending])
+            except Exception as e:
+                results = [e] * len(pending)
+            failed = []
+            for (item, enqueued), error in zip(pending, results):
+                if error is None:
+                    self._done(enqueued)
+                elif attempt >= self.max_retries or self._stopping.is_set():
+                    self._count("failed")
+                    LOG.error(f"Upload definitief mislukt na {attempt + 1} pogingen: {error}")
+                    if self.on_failure:
+                        self.on_failure(item, error)
+                else:
+                    failed.append((item, enqueued, error))
+            if not failed:
+                return
+            delay = self.backoff * (2 ** attempt)
+            attempt += 1
+            self._count("retries", len(failed))
+            LOG.warning(f"{len(failed)} upload(s) mislukt ({failed[0][2]}), "
+                        f"nieuwe poging {attempt} over {delay:.1f}s")
+            # wait() keert direct terug zodra stop() wordt aangeroepen
+            self._stopping.wait(delay)
+            pending = [(item, enqueued) for item, enqueued, _ in failed]
+
+    def _done(self, enqueued):
+        latency = time.monotonic() - enqueued
+        with self._lock:
+            self._stats["completed"] += 1
+            self._stats["latency_total"] += latency
+            self._stats["latency_max"] = max(self._stats["latency_max"], latency)
+            self._stats["latency_last"] = latency
+        LOG.debug(f"Upload klaar in {latency:.3f}s, wachtrij diepte {self._queue.qsize()}")
+
+    def stats(self):
+        """Wachtrij diepte, tellers en latency (submit tot upload klaar) in seconden"""
+        with self._lock:
+            stats = dict(self._stats)
+        latency_total = stats.pop("latency_total")
+        stats["depth"] = self._queue.qsize()
+        stats["latency_avg"] = latency_total / stats["completed"] if stats["completed"] else 0.0
+        return stats
+
+    def stop(self, drain=True, timeout=30):
+        """Stop de workers; met drain worden de resterende notities eerst nog geüpload"""
+        if not drain:
+            self._stopping.set()
+            dropped = 0
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._queue.task_done()
+                dropped += 1
+            if dropped:
+                LOG.warning(f"{dropped} notitie(s) niet geüpload bij afsluiten")
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        self._stopping.set()
+        self._threads = []
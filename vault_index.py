@@ -0,0 +1,170 @@
+import json
+import os
+import posixpath
+import re
+import threading
+from collections import defaultdict
+from ovos_utils.log import LOG
+
+_TERM_RE = re.compile(r"\w{3,}")
+_TAG_RE = re.compile(r"(?<![\w#])#([\w/-]+)")
+_FRONTMATTER_TAGS_RE = re.compile(r"^tags:\s*\[?([^\]\n]*)\]?\s*$", re.M)
+# Woorden die in bijna elke titel staan en niets over het onderwerp zeggen
+STOPWORDS = frozenset((
+    "een", "het", "de", "en", "van", "voor", "met", "over", "naar", "bij", "uit", "aan",
+    "the", "and", "for", "with", "notitie", "note", "dagverslag"
+))
+
+
+def terms(text):
+    """Zoektermen uit een titel of tag: woorden van minstens 3 tekens, zonder stopwoorden"""
+    return {term for term in _TERM_RE.findall(text.lower()) if term not in STOPWORDS}
+
+
+def parse_note(name, head):
+    """Titel en tags uit het begin van een notitie; zonder kop is de bestandsnaam de titel"""
+    title = posixpath.splitext(name)[0]
+    for line in head.splitlines():
+        if line.startswith("# "):
+            title = line[2:].strip()
+            break
+    tags = set(_TAG_RE.findall(head))
+    if head.startswith("---"):
+        for match in _FRONTMATTER_TAGS_RE.findall(head.split("\n---", 1)[0]):
+            tags.update(tag.strip(" '\"#") for tag in match.split(",") if tag.strip(" '\"#"))
+    return title, sorted(tags)
+
+
+class VaultIndex:
+    """Lokale index van de vault: titels, tags en een inverted index op termen.
+
+    refresh() loopt de vault door via de opslag en gebruikt een manifest met
+    de mtime per map: een map waarvan de mtime niet veranderd is wordt niet
+    opnieuw gelist, en alleen nieuwe of gewijzigde notities (mtime/grootte)
+    worden gelezen. Een notitie die in een ongewijzigde map bewerkt wordt,
+    wordt bij de volgende volledige refresh (full=True) opgepikt.
+    related() is daarna een query in het geheugen.
+    """
+
+    def __init__(self, path=None, max_read=4096):
+        self.path = path
+        self.max_read = max_read
+        self._lock = threading.Lock()
+        self._dirs = {}  # map -> {"mtime", "dirs", "files"}
+        self._files = {}  # notitie pad -> [mtime, grootte, titel, tags]
+        self._terms = defaultdict(set)  # term -> notitie paden
+        self.refreshes = 0
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            LOG.warning(f"Vault index {self.path} niet gelezen, volledige scan nodig: {e}")
+            return
+        self._dirs = data.get("dirs", {})
+        self._files = data.get("files", {})
+        self._rebuild_terms()
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"dirs": self._dirs, "files": self._files}, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            LOG.warning(f"Vault index niet opgeslagen: {e}")
+
+    def _rebuild_terms(self):
+        index = defaultdict(set)
+        for path, (_, _, title, tags) in self._files.items():
+            for term in self._note_terms(title, tags):
+                index[term].add(path)
+        self._terms = index
+
+    @staticmethod
+    def _note_terms(title, tags):
+        found = terms(title)
+        for tag in tags:
+            found |= terms(tag.replace("/", " "))
+        return found
+
+    def refresh(self, storage, full=False):
+        """Werk de index bij vanuit de opslag, geeft het aantal (opnieuw) gelezen notities"""
+        dirs, files, read = {}, {}, 0
+        stack = [("", None)]
+        while stack:
+            directory, mtime = stack.pop()
+            if mtime is None:
+                mtime = storage.stat_mtime(directory)
+            known = self._dirs.get(directory)
+            if known and mtime is not None and known["mtime"] == mtime and not full:
+                # Ongewijzigde map: namen uit het manifest, submappen wel controleren
+                dirs[directory] = known
+                for name in known["files"]:
+                    path = posixpath.join(directory, name)
+                    if path in self._files:
+                        files[path] = self._files[path]
+                stack.extend((posixpath.join(directory, name), None) for name in known["dirs"])
+                continue
+            entry = {"mtime": mtime, "dirs": [], "files": []}
+            for name, is_dir, child_mtime, size in storage.list_dir(directory):
+                if name.startswith("."):
+                    continue  # .obsidian, .trash en tijdelijke bestanden
+                path = posixpath.join(directory, name)
+                if is_dir:
+                    entry["dirs"].append(name)
+                    stack.append((path, child_mtime))
+                    continue
+                if not name.endswith(".md"):
+                    continue
+                entry["files"].append(name)
+                current = self._files.get(path)
+                if current and child_mtime is not None and current[0] == child_mtime and current[1] == size:
+                    files[path] = current
+                    continue
+                try:
+                    title, tags = parse_note(name, storage.read_head(path, self.max_read))
+                except Exception as e:
+                    LOG.debug(f"Vault index: {path} niet gelezen: {e}")
+                    continue
+                files[path] = [child_mtime, size, title, tags]
+                read += 1
+            dirs[directory] = entry
+        with self._lock:
+            self._dirs, self._files = dirs, files
+            self._rebuild_terms()
+            self.refreshes += 1
+        self._save()
+        return read
+
+    def add(self, path, title, tags=()):
+        """Neem een zojuist geschreven notitie direct op, zonder op de volgende refresh te wachten"""
+        with self._lock:
+            self._files[path] = [None, None, title, sorted(tags)]
+            for term in self._note_terms(title, tags):
+                self._terms[term].add(path)
+
+    def related(self, title, extra="", limit=5):
+        """Notitienamen (zonder .md) waarvan titel of tags het meest overlappen met title/extra"""
+        query = terms(title) | terms(extra)
+        scores = defaultdict(int)
+        with self._lock:
+            for term in query:
+                for path in self._terms.get(term, ()):
+                    scores[path] += 1
+        ranked = sorted(scores, key=lambda path: (-scores[path], path))[:limit]
+        return [posixpath.splitext(posixpath.basename(path))[0] for path in ranked]
+
+    def stats(self):
+        return {"notes": len(self._files), "dirs": len(self._dirs),
+                "terms": len(self._terms), "refreshes": self.refreshes}
+
+    def __len__(self):
+        return len(self._files)
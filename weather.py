@@ -0,0 +1,92 @@
+import threading
+import time
+from ovos_utils.log import LOG
+from .metrics import NoteMetrics
+
+DEFAULT_WEATHER_URL = "http://api.openweathermap.org/data/2.5/weather"
+UNIT_SYMBOLS = {"metric": "°C", "imperial": "°F", "standard": "K"}
+
+
+class WeatherCache:
+    """Weersomschrijving per (stad, taal, eenheden) met TTL en een gedeelde HTTP sessie"""
+
+    def __init__(self, api_key, ttl=1800, url=DEFAULT_WEATHER_URL, lang="nl",
+                 units="metric", timeout=5, metrics=None):
+        self.api_key = api_key
+        self.ttl = ttl
+        self.url = url
+        self.lang = lang
+        self.units = units
+        self.timeout = timeout
+        self.metrics = metrics or NoteMetrics()
+        self._session = None
+        self._cache = {}  # (stad, taal, eenheden) -> (omschrijving, opgehaald op)
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """HTTP sessie, requests wordt pas bij de eerste weer aanvraag geladen"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+            self._session = session
+        return self._session
+
+    def get(self, city, allow_stale=False):
+        """Geef het weer voor city; alleen bij een verlopen cache wordt de API aangeroepen.
+
+        Met allow_stale wordt een verlopen waarde direct teruggegeven, bv. als
+        een achtergrond refresh de cache actueel houdt.
+        """
+        value = self.cached(city, allow_stale)
+        if value is not None:
+            return value
+        return self.refresh(city)
+
+    def cached(self, city, allow_stale=False):
+        """Het weer uit de cache zonder netwerk, None als er geen (geldige) waarde is"""
+        cached = self._cache.get((city, self.lang, self.units))
+        if cached:
+            value, fetched = cached
+            if allow_stale or time.monotonic() - fetched < self.ttl:
+                return value
+        return None
+
+    def refresh(self, city):
+        """Haal het weer opnieuw op, bij een fout blijft de oude waarde staan"""
+        key = (city, self.lang, self.units)
+        with self._lock:
+            value = self._fetch(city)
+            if value is not None:
+                self._cache[key] = (value, time.monotonic())
+                return value
+            cached = self._cache.get(key)
+        if cached:
+            LOG.debug(f"Weer voor {city} niet ververst, oude waarde gebruikt")
+            return cached[0]
+        return "Onbekend"
+
+    def _fetch(self, city):
+        if not self.api_key:
+            LOG.debug("Geen OpenWeatherMap API key gevonden in settings")
+            return None
+        try:
+            params = {"q": city, "lang": self.lang, "units": self.units, "appid": self.api_key}
+            response = self.session.get(self.url, params=params, timeout=self.timeout)
+            if response.status_code == 200:
+                data = response.json()
+                desc = data["weather"][0]["description"]
+                temp = data["main"]["temp"]
+                return f"{desc}, {temp:.0f}{UNIT_SYMBOLS.get(self.units, '')}"
+            LOG.warning(f"Weer API gaf statuscode {response.status_code}")
+        except Exception as e:
+            LOG.warning(f"Weer ophalen mislukt: {e}")
+        self.metrics.inc("weather_failures")
+        return None
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()